@@ -0,0 +1,291 @@
+"""hyyhtml 无界面基准测试：桥接往返延迟、吞吐量、日志吞吐、截图编码和冷启动
+
+在 offscreen 平台下启动 Window，通过注入的JavaScript驱动 hyyhtml.callPython，
+结果写入JSON文件，便于在不同提交之间比较。
+
+用法:
+    python benchmarks/bench_bridge.py [--output bench_results.json] [--compare old.json]
+    python benchmarks/bench_bridge.py --smoke   # 小规模快速跑一遍，未完成时返回非零退出码
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 冷启动计时从导入 hyyhtml 之前开始
+PROCESS_START = time.perf_counter()
+
+from PyQt6.QtCore import QTimer, PYQT_VERSION_STR, QT_VERSION_STR
+from hyyhtml import Window
+
+JS_WAIT_READY = """
+(function wait() {
+    if (window.hyyhtml && window.hyyhtml.ready) {
+        window.hyyhtml.callPython('bench_ready');
+    } else {
+        setTimeout(wait, 1);
+    }
+})();
+"""
+
+JS_LATENCY = """
+(async function() {
+    const samples = [];
+    for (let i = 0; i < %(calls)d; i++) {
+        const start = performance.now();
+        await window.hyyhtml.callPython('bench_echo', i);
+        samples.push(performance.now() - start);
+    }
+    window.hyyhtml.callPython('bench_report', 'latency', samples);
+})();
+"""
+
+JS_THROUGHPUT = """
+(async function() {
+    const results = {};
+    for (const size of %(sizes)s) {
+        const payload = 'x'.repeat(size);
+        const start = performance.now();
+        for (let done = 0; done < %(calls)d; done += %(concurrency)d) {
+            const batch = [];
+            for (let i = 0; i < %(concurrency)d; i++) {
+                batch.push(window.hyyhtml.callPython('bench_echo', payload));
+            }
+            await Promise.all(batch);
+        }
+        results[size] = %(calls)d / ((performance.now() - start) / 1000);
+    }
+    window.hyyhtml.callPython('bench_report', 'throughput', results);
+})();
+"""
+
+JS_LOG_COUNTER = """
+(function() {
+    let received = 0;
+    let dropped = 0;
+    let reported = false;
+    window.hyyhtml._bridge.logBatchToJS.connect(function(entries) {
+        for (const [, level, message] of JSON.parse(entries)) {
+            // 缓冲区溢出时 LogBuffer 用一条警告代替被丢弃的日志
+            const match = level === 'warning' && /^(\\d+) log messages dropped$/.exec(message);
+            if (match) {
+                dropped += Number(match[1]);
+            } else {
+                received += 1;
+            }
+        }
+        if (!reported && received + dropped >= %(count)d) {
+            reported = true;
+            window.hyyhtml.callPython('bench_report', 'logs', {received: received, dropped: dropped});
+        }
+    });
+    window.hyyhtml.callPython('bench_report', 'log_ready', true);
+})();
+"""
+
+
+def percentiles(samples):
+    """返回常用分位数(毫秒)"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {
+        "count": len(ordered),
+        "min": round(ordered[0], 4),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 4),
+        "mean": round(sum(ordered) / len(ordered), 4),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BridgeBenchmark:
+    """按顺序执行各项测试，全部完成后写出结果并退出事件循环"""
+
+    def __init__(self, options):
+        self.options = options
+        self.results = {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "qt": QT_VERSION_STR,
+            "pyqt": PYQT_VERSION_STR,
+            "platform": os.environ.get("QT_QPA_PLATFORM"),
+        }
+        self.finished = False
+
+        window_start = time.perf_counter()
+        self.window = Window(dispatch_mode=options.dispatch_mode, fast_start=options.fast_start)
+        self.window_created = time.perf_counter()
+        self.results["startup"] = {"import_ms": round((window_start - PROCESS_START) * 1000, 3),
+                                   "window_ms": round((self.window_created - window_start) * 1000, 3)}
+        self.window.set_log_level("debug")
+
+        @self.window.api
+        def bench_echo(value):
+            return value
+
+        @self.window.api(executor="main")
+        def bench_ready():
+            self.on_ready()
+
+        @self.window.api(executor="main")
+        def bench_report(name, data):
+            getattr(self, f"on_{name}")(data)
+
+        if self.window.browser is None:
+            self.window.webViewReady.connect(
+                lambda: self.window.browser.loadFinished.connect(self.on_load_finished))
+        else:
+            self.window.browser.loadFinished.connect(self.on_load_finished)
+
+    def run_js(self, code):
+        self.window.page.runJavaScript(code)
+
+    def run(self):
+        self.window.show()
+        QTimer.singleShot(self.options.timeout * 1000, self.on_timeout)
+        return Window._app_instance.exec()
+
+    def on_load_finished(self, ok):
+        self.results["startup"]["load_finished_ms"] = round(
+            (time.perf_counter() - PROCESS_START) * 1000, 3)
+        self.run_js(JS_WAIT_READY)
+
+    def on_ready(self):
+        self.results["startup"]["cold_start_to_ready_ms"] = round(
+            (time.perf_counter() - PROCESS_START) * 1000, 3)
+        self.results["startup"]["phases"] = self.window.startup_timings()["phases"]
+        self.run_js(JS_LATENCY % {"calls": self.options.calls})
+
+    def on_latency(self, samples):
+        self.results["round_trip_ms"] = percentiles(samples)
+        self.run_js(JS_THROUGHPUT % {"calls": self.options.calls,
+                                     "concurrency": self.options.concurrency,
+                                     "sizes": json.dumps(self.options.sizes)})
+
+    def on_throughput(self, results):
+        self.results["calls_per_second"] = {size: round(rate, 1) for size, rate in results.items()}
+        self.run_js(JS_LOG_COUNTER % {"count": self.options.logs})
+
+    def on_log_ready(self, _):
+        self.log_started = time.perf_counter()
+        self.log_sent = 0
+        self.send_logs()
+
+    def send_logs(self):
+        # 每个发送间隔最多写入一个缓冲区容量的日志，避免 LogBuffer 溢出丢弃
+        buffer = self.window.bridge.log_buffer
+        end = min(self.options.logs, self.log_sent + buffer.entries.maxlen)
+        for i in range(self.log_sent, end):
+            self.window.log(f"benchmark message {i}")
+        self.log_sent = end
+        if end < self.options.logs:
+            QTimer.singleShot(buffer.interval_ms + 1, self.send_logs)
+
+    def on_logs(self, counts):
+        elapsed = time.perf_counter() - self.log_started
+        received = counts["received"]
+        self.results["logs"] = {"messages": received,
+                                "dropped": counts["dropped"],
+                                "elapsed_ms": round(elapsed * 1000, 3),
+                                "messages_per_second": round(received / elapsed, 1)}
+        QTimer.singleShot(0, self.measure_capture)
+
+    def measure_capture(self):
+        capture = {}
+        for fmt in ("png", "jpeg"):
+            runs = [self.window.capture_window({"format": fmt}) for _ in range(self.options.captures)]
+            for result in runs:
+                self.window.release_blob(result["blob"])
+            capture[fmt] = {
+                stage: percentiles([result["timings"][stage] for result in runs])
+                for stage in ("grab_ms", "scale_ms", "encode_ms")
+            }
+            capture[fmt]["bytes"] = runs[-1]["size"]
+        self.results["capture"] = capture
+        self.finish()
+
+    def on_timeout(self):
+        self.results["error"] = f"timed out after {self.options.timeout}s"
+        self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        with open(self.options.output, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=2)
+        print(json.dumps(self.results, indent=2))
+        if self.options.compare:
+            compare(self.options.compare, self.results)
+        self.window.bridge.shutdown()
+        Window._app_instance.quit()
+
+
+def compare(path, current):
+    """打印与之前结果相比的主要指标变化"""
+    with open(path, encoding="utf-8") as f:
+        previous = json.load(f)
+
+    rows = [("round trip p50 (ms)", ("round_trip_ms", "p50")),
+            ("round trip p99 (ms)", ("round_trip_ms", "p99")),
+            ("cold start (ms)", ("startup", "cold_start_to_ready_ms")),
+            ("logs/s", ("logs", "messages_per_second"))]
+    rows += [(f"calls/s @{size}B", ("calls_per_second", size))
+             for size in current.get("calls_per_second", {})]
+
+    print(f"\n{'metric':<24}{'before':>12}{'after':>12}{'change':>10}")
+    for label, (section, key) in rows:
+        before = previous.get(section, {}).get(key)
+        after = current.get(section, {}).get(key)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{label:<24}{before:>12}{after:>12}{change:>9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="与之前的结果文件比较")
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 1024, 65536])
+    parser.add_argument("--logs", type=int, default=10000)
+    parser.add_argument("--captures", type=int, default=5)
+    parser.add_argument("--dispatch-mode", default="main", choices=["main", "thread"])
+    parser.add_argument("--fast-start", action="store_true", help="延迟创建WebEngine视图")
+    parser.add_argument("--timeout", type=int, default=120)
+    parser.add_argument("--smoke", action="store_true", help="用很小的规模快速检查基准测试能否跑完")
+    options = parser.parse_args()
+    if options.smoke:
+        options.calls, options.concurrency, options.sizes = 20, 5, [16]
+        options.logs, options.captures, options.timeout = 2500, 1, 30
+    benchmark = BridgeBenchmark(options)
+    benchmark.run()
+    if "error" in benchmark.results:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""调度开销微基准：对比旧的 hasattr/getattr 查找与预编译调度表
+
+用法: python benchmarks/bench_dispatch.py [--calls N]
+"""
+import os
+import sys
+import time
+import argparse
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hyyhtml import Window
+
+
+def legacy_resolve(window, funcName):
+    """旧版 JSBridge.handleCall 的查找方式"""
+    if hasattr(window, funcName) and callable(getattr(window, funcName)):
+        return getattr(window, funcName)
+    if funcName in window.exposed_functions:
+        return window.exposed_functions[funcName]
+    raise Exception(f"Function '{funcName}' not found")
+
+
+def table_resolve(window, funcName):
+    """新版调度表查找方式(包含参数检查与转换)"""
+    entry = window.bridge.resolve(funcName)
+    return entry.func, entry.convert
+
+
+def measure(fn, calls):
+    """返回每次调用的平均耗时(纳秒)"""
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter_ns() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    options = parser.parse_args()
+
+    window = Window()
+
+    @window.api
+    def add(a: int, b: int):
+        return a + b
+
+    args = [1.0, 2.0]
+    cases = {
+        "api function": "add",
+        "window method": "get_zoom",
+    }
+
+    print(f"{'target':<16}{'legacy ns/call':>16}{'table ns/call':>16}{'saved':>10}")
+    for label, name in cases.items():
+        def legacy():
+            func = legacy_resolve(window, name)
+            return func(*args) if name == "add" else func()
+
+        def table():
+            func, convert = table_resolve(window, name)
+            return func(*convert(args)) if name == "add" else func()
+
+        legacy_ns = measure(legacy, options.calls)
+        table_ns = measure(table, options.calls)
+        print(f"{label:<16}{legacy_ns:>16.0f}{table_ns:>16.0f}{legacy_ns - table_ns:>10.0f}")
+
+    # 未注册名字：旧实现要遍历整个QMainWindow命名空间后才失败
+    def legacy_miss():
+        try:
+            legacy_resolve(window, "no_such_function")
+        except Exception:
+            pass
+
+    def table_miss():
+        try:
+            table_resolve(window, "no_such_function")
+        except Exception:
+            pass
+
+    legacy_ns = measure(legacy_miss, options.calls)
+    table_ns = measure(table_miss, options.calls)
+    print(f"{'unknown name':<16}{legacy_ns:>16.0f}{table_ns:>16.0f}{legacy_ns - table_ns:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
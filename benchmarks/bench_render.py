@@ -0,0 +1,108 @@
+"""批量渲染基准：比较不同网页池大小下把HTML报表渲染为PNG/PDF的吞吐量
+
+生成 --documents 个带表格和内联SVG图表的报表页面，依次用 --pools 中的每个池大小渲染，
+记录每秒文档数以及加载、空闲、抓取和写文件各阶段耗时的分位数。
+
+用法:
+    python benchmarks/bench_render.py [--documents 40] [--pools 1 2 4 8] [--format png] [--output render.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtCore import QTimer
+from hyyhtml import BatchRenderer, Window
+
+
+def report_html(index, rows):
+    """一个带表格和柱状图的报表页面"""
+    values = [(index * 37 + row * 11) % 100 for row in range(rows)]
+    bars = "".join(f'<rect x="{i * 12}" y="{100 - v}" width="10" height="{v}" fill="#4a6fa5"/>'
+                   for i, v in enumerate(values))
+    table = "".join(f"<tr><td>Item {row}</td><td>{value}</td><td>{value * 1.5:.2f}</td></tr>"
+                    for row, value in enumerate(values))
+    return (f"<!DOCTYPE html><html><head><style>body{{font-family:sans-serif;margin:24px}}"
+            f"td{{border-bottom:1px solid #ddd;padding:4px 12px}}</style></head><body>"
+            f"<h1>Report {index}</h1><svg width='{rows * 12}' height='100'>{bars}</svg>"
+            f"<table>{table}</table></body></html>")
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {"p50": round(ordered[len(ordered) // 2], 3),
+            "p90": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 3),
+            "max": round(ordered[-1], 3)}
+
+
+class RenderBenchmark:
+    """按顺序用每个池大小渲染同一批文档"""
+
+    def __init__(self, options):
+        self.options = options
+        Window.ensure_application()
+        self.documents = [report_html(index, options.rows) for index in range(options.documents)]
+        self.pools = list(options.pools)
+        self.results = {"documents": options.documents, "format": options.format, "runs": []}
+        self.renderer = None
+        self.output_dir = tempfile.mkdtemp(prefix="hyyhtml-render-")
+
+    def run(self):
+        QTimer.singleShot(0, self.next_run)
+        QTimer.singleShot(self.options.timeout * 1000, self.finish)
+        return Window._app_instance.exec()
+
+    def next_run(self):
+        if self.renderer is not None:
+            self.renderer.close()
+        if not self.pools:
+            self.finish()
+            return
+        pool_size = self.pools.pop(0)
+        self.renderer = BatchRenderer(pool_size=pool_size, width=800, height=600)
+        self.renderer.finished.connect(self.on_finished)
+        self.renderer.render(self.documents, os.path.join(self.output_dir, str(pool_size)), self.options.format)
+
+    def on_finished(self, summary):
+        phases = {}
+        for document in summary["documents"]:
+            for phase, value in document["timings"].items():
+                phases.setdefault(phase, []).append(value)
+        run = {"pool_size": summary["pool_size"],
+               "rendered": summary["rendered"],
+               "elapsed_ms": summary["elapsed_ms"],
+               "documents_per_second": summary["documents_per_second"],
+               "phases_ms": {phase: percentiles(values) for phase, values in phases.items()}}
+        self.results["runs"].append(run)
+        print(f"pool {run['pool_size']:>3}: {run['documents_per_second']:>8} docs/s")
+        QTimer.singleShot(0, self.next_run)
+
+    def finish(self):
+        self.results["timestamp"] = time.time()
+        with open(self.options.output, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=2)
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        Window._app_instance.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=50, help="每个报表的表格行数")
+    parser.add_argument("--pools", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--format", default="png", choices=["png", "pdf"])
+    parser.add_argument("--output", default="bench_render.json")
+    parser.add_argument("--timeout", type=int, default=600)
+    RenderBenchmark(parser.parse_args()).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""多窗口内存基准：测量每个窗口的内存占用(Python进程和Chromium渲染进程)
+
+依次创建 --windows 个窗口，每个窗口的页面加载完成后记录一次内存，
+按窗口数做线性拟合得到每个窗口的平均占用。
+--mode app 使用 Application 共享网页配置、线程池和事件循环；
+--mode standalone 每个窗口各自创建，用于比较。
+
+内存读取自 /proc(仅Linux)，渲染进程为本进程的 QtWebEngineProcess 子进程。
+渲染进程的数量和占用取决于Chromium的进程模型，app 和 standalone 两种模式都应测量后再比较。
+
+用法:
+    python benchmarks/bench_windows.py [--windows 20] [--mode app] [--output windows.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtCore import QTimer
+from hyyhtml import Application, Window
+
+
+def rss_kb(pid):
+    """进程的常驻内存(KB)，进程已退出时返回 0"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def child_pids(pid):
+    """递归列出子进程"""
+    children = []
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", encoding="ascii") as f:
+            direct = [int(child) for child in f.read().split()]
+    except OSError:
+        return children
+    for child in direct:
+        children.append(child)
+        children.extend(child_pids(child))
+    return children
+
+
+def memory_sample():
+    pid = os.getpid()
+    children = child_pids(pid)
+    return {"python_kb": rss_kb(pid),
+            "renderer_kb": sum(rss_kb(child) for child in children),
+            "processes": len(children)}
+
+
+def slope(points):
+    """最小二乘拟合 y = a + b * x，返回 b"""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var if var else 0.0
+
+
+class WindowBenchmark:
+    """逐个创建窗口，等待页面加载完成后记录内存"""
+
+    def __init__(self, options):
+        self.options = options
+        if options.mode == "app":
+            self.app = Application()
+        else:
+            self.app = None
+            Window.ensure_application()
+        self.windows = []
+        self.samples = [dict(memory_sample(), windows=0)]
+        self.finished = False
+
+    def run(self):
+        QTimer.singleShot(0, self.open_next)
+        QTimer.singleShot(self.options.timeout * 1000, self.finish)
+        return Window._app_instance.exec()
+
+    def open_next(self):
+        if len(self.windows) >= self.options.windows:
+            self.finish()
+            return
+        index = len(self.windows)
+        if self.app is not None:
+            window = self.app.create_window(f"panel-{index}")
+        else:
+            window = Window()
+        window.resize(320, 240)
+        window.show()
+        self.windows.append(window)
+        window.browser.loadFinished.connect(lambda ok: QTimer.singleShot(self.options.settle, self.record))
+
+    def record(self):
+        self.samples.append(dict(memory_sample(), windows=len(self.windows)))
+        self.open_next()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        loaded = self.samples[1:]
+        results = {
+            "mode": self.options.mode,
+            "windows": len(self.windows),
+            "samples": self.samples,
+            "per_window_kb": {
+                "python": round(slope([(s["windows"], s["python_kb"]) for s in loaded]), 1),
+                "renderer": round(slope([(s["windows"], s["renderer_kb"]) for s in loaded]), 1),
+                "total": round(slope([(s["windows"], s["python_kb"] + s["renderer_kb"]) for s in loaded]), 1),
+            },
+            "timestamp": time.time(),
+        }
+        with open(self.options.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(json.dumps(results["per_window_kb"], indent=2))
+        Window._app_instance.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", type=int, default=20)
+    parser.add_argument("--mode", default="app", choices=["app", "standalone"])
+    parser.add_argument("--settle", type=int, default=500, help="页面加载完成后等待的毫秒数")
+    parser.add_argument("--output", default="bench_windows.json")
+    parser.add_argument("--timeout", type=int, default=300)
+    WindowBenchmark(parser.parse_args()).run()
+
+
+if __name__ == "__main__":
+    main()
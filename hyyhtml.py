@@ -2,90 +2,3418 @@ import sys
 import json
 import uuid
 import os
+import re
 import logging
 import base64
-from functools import wraps
+import asyncio
+import inspect
+import threading
+import time
+import heapq
+import itertools
+import mimetypes
+import posixpath
+import zipfile
+import contextvars
+import struct
+from collections import deque, OrderedDict
+from functools import wraps, partial
+from types import MappingProxyType
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
-from PyQt6.QtWebEngineWidgets import QWebEngineView
+# URL scheme 必须在创建QApplication之前注册，页面和 scheme 处理器的基类也在模块顶层使用，
+# 因此 QtWebEngineCore 总是在导入时加载；快速启动只推迟较慢的 QtWebEngineWidgets，见 load_webengine
+from PyQt6.QtWebEngineCore import (QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob,
+                                   QWebEngineProfile, QWebEnginePage, QWebEngineScript)
 from PyQt6.QtWebChannel import QWebChannel
 
 # 设置日志记录
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('hyyhtml')
 
+def load_webengine():
+    """导入 QWebEngineView
+
+    QtWebEngineWidgets 的导入较慢，快速启动模式下推迟到窗口显示之后才导入
+    """
+    from PyQt6.QtWebEngineWidgets import QWebEngineView
+    return QWebEngineView
+
+
+class StartupPhases:
+    """记录窗口启动各阶段的耗时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = {}
+
+    def mark(self, phase):
+        """记录从上一阶段结束到现在的耗时"""
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self.last) * 1000, 3)
+        self.last = now
+
+    def snapshot(self):
+        return {"phases": dict(self.phases), "total_ms": round((self.last - self.started) * 1000, 3)}
+
+
+# API函数可用的执行方式
+DISPATCH_MODES = ("main", "thread")
+# @window.api(executor=...) 还可以使用进程池
+API_EXECUTORS = DISPATCH_MODES + ("process",)
+# 调用的优先级通道，按顺序优先服务
+PRIORITIES = ("interactive", "normal", "bulk")
+
+# 截图支持的编码格式: 名称 -> (Qt格式, MIME类型)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+# 日志级别，低于窗口 log_level 的日志在Python端直接丢弃
+LOG_LEVELS = {
+    "debug": 10,
+    "info": 20,
+    "success": 25,
+    "warning": 30,
+    "error": 40,
+}
+
+# 正在处理JavaScript调用的窗口，见 current_window()
+CURRENT_WINDOW = contextvars.ContextVar("hyyhtml_window", default=None)
+
+
+def current_window():
+    """返回发起当前调用的窗口，在API函数(包括线程池和async def函数)中使用"""
+    return CURRENT_WINDOW.get()
+
+
+class CancelToken:
+    """调用的协作式取消标记
+
+    JavaScript端超时、通过 AbortSignal 取消或页面重新加载时被取消。
+    尚未开始的调用直接丢弃，正在执行的函数可以检查 cancelled、
+    调用 raise_if_cancelled() 或用 wait(秒) 代替 time.sleep 以便及时退出。
+    """
+    __slots__ = ("event", "reason")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self, reason="abort"):
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+
+    def raise_if_cancelled(self):
+        if self.event.is_set():
+            raise CancelledError(f"Call cancelled ({self.reason})")
+
+    def wait(self, timeout=None):
+        """等待最多 timeout 秒，已取消时返回 True"""
+        return self.event.wait(timeout)
+
+
+# 当前调用的取消标记，见 cancel_token()
+CURRENT_CANCEL = contextvars.ContextVar("hyyhtml_cancel", default=None)
+
+
+def cancel_token():
+    """返回当前调用的取消标记，在线程池和async def API函数中使用
+
+    在GUI线程中同步执行的调用不会被取消，每次得到一个新的、永远不会被设置的标记
+    """
+    token = CURRENT_CANCEL.get()
+    return token if token is not None else CancelToken()
+
+
+# 自定义协议名，例如 hyyhtml://blob/<id>
+SCHEME = b"hyyhtml"
+_scheme_registered = False
+
+
+def register_url_scheme():
+    """注册 hyyhtml:// 协议，必须在创建QApplication之前调用"""
+    global _scheme_registered
+    if _scheme_registered:
+        return
+    
+    scheme = QWebEngineUrlScheme(SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    flags = (QWebEngineUrlScheme.Flag.SecureScheme
+             | QWebEngineUrlScheme.Flag.LocalAccessAllowed
+             | QWebEngineUrlScheme.Flag.CorsEnabled)
+    # Qt 6.6 之前没有 FetchApiAllowed
+    if hasattr(QWebEngineUrlScheme.Flag, "FetchApiAllowed"):
+        flags |= QWebEngineUrlScheme.Flag.FetchApiAllowed
+    scheme.setFlags(flags)
+    QWebEngineUrlScheme.registerScheme(scheme)
+    _scheme_registered = True
+
+
+class BlobStore:
+    """保存通过 hyyhtml://blob/<id> 提供给页面的二进制数据
+
+    每个数据块带有引用计数和过期时间，引用计数归零或过期后即被释放。
+    可以在任意线程中使用。
+    """
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.blobs = {}
+
+    def add(self, data, mime, ttl=None):
+        """保存数据并返回其标识，初始引用计数为1"""
+        blob_id = uuid.uuid4().hex
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.blobs[blob_id] = {"data": data, "mime": mime, "refs": 1, "expires": expires}
+        return blob_id
+
+    def get(self, blob_id):
+        """返回 (数据, MIME类型)，不存在或已过期时返回 None"""
+        with self.lock:
+            blob = self.blobs.get(blob_id)
+            if blob is None or blob["expires"] < time.monotonic():
+                return None
+            return blob["data"], blob["mime"]
+
+    def retain(self, blob_id):
+        """增加引用计数"""
+        with self.lock:
+            if blob_id not in self.blobs:
+                return False
+            self.blobs[blob_id]["refs"] += 1
+            return True
+
+    def release(self, blob_id):
+        """减少引用计数，归零时释放数据"""
+        with self.lock:
+            blob = self.blobs.get(blob_id)
+            if blob is None:
+                return False
+            blob["refs"] -= 1
+            if blob["refs"] <= 0:
+                del self.blobs[blob_id]
+            return True
+
+    def sweep(self):
+        """释放所有已过期的数据，返回释放的数量"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [blob_id for blob_id, blob in self.blobs.items() if blob["expires"] < now]
+            for blob_id in expired:
+                del self.blobs[blob_id]
+        return len(expired)
+
+    def stats(self):
+        with self.lock:
+            return {"count": len(self.blobs),
+                    "bytes": sum(len(blob["data"]) for blob in self.blobs.values())}
+
+
+# mimetypes 在部分系统上缺少或读取到错误的类型，前端常用类型以此为准
+ASSET_TYPES = {
+    ".html": "text/html", ".htm": "text/html", ".css": "text/css",
+    ".js": "text/javascript", ".mjs": "text/javascript", ".json": "application/json",
+    ".map": "application/json", ".svg": "image/svg+xml", ".wasm": "application/wasm",
+    ".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".gif": "image/gif",
+    ".webp": "image/webp", ".ico": "image/x-icon", ".woff": "font/woff", ".woff2": "font/woff2",
+    ".ttf": "font/ttf", ".txt": "text/plain",
+}
+
+
+def guess_mime(path):
+    """根据扩展名返回MIME类型"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ASSET_TYPES:
+        return ASSET_TYPES[ext]
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+class AssetBundle:
+    """通过 hyyhtml://<host>/<path> 提供的应用资源，来源为目录或zip文件
+
+    目录中的文件整体读入内存，ETag由修改时间和大小生成，文件变化后自动失效；
+    zip包视为不可变，ETag由CRC和大小生成。
+    最近访问的资源保存在按字节数限制的LRU中，超过 max_entry 的文件不缓存。
+    可以在任意线程中使用。
+    """
+
+    def __init__(self, path, index="index.html", max_bytes=32 * 1024 * 1024, max_entry=4 * 1024 * 1024):
+        self.path = os.path.abspath(path)
+        self.index = index
+        self.max_bytes = max_bytes
+        self.max_entry = max_entry
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        if os.path.isdir(self.path):
+            self.archive = None
+        elif zipfile.is_zipfile(self.path):
+            self.archive = zipfile.ZipFile(self.path)
+        else:
+            raise ValueError(f"Bundle must be a directory or zip file: {path}")
+
+    def normalize(self, path):
+        """规范化请求路径，拒绝跳出包根目录的路径"""
+        path = posixpath.normpath("/" + path).lstrip("/")
+        if path in ("", "."):
+            return self.index
+        if path.split("/")[0] == "..":
+            return None
+        return path
+
+    def locate(self, path):
+        """返回 (文件标识, ETag)，文件不存在时返回 None"""
+        if self.archive is not None:
+            try:
+                info = self.archive.getinfo(path)
+            except KeyError:
+                return None
+            return info, f'"{info.CRC:08x}-{info.file_size:x}"'
+
+        filename = os.path.normpath(os.path.join(self.path, *path.split("/")))
+        if os.path.commonpath([self.path, filename]) != self.path:
+            return None
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        if not os.path.isfile(filename):
+            return None
+        return filename, f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+    def read_file(self, source):
+        if self.archive is not None:
+            # ZipFile 不能在多个线程中同时读取
+            with self.lock:
+                return self.archive.read(source)
+        # 数据要在缓存和响应中保留，mmap 之后仍需复制一次，直接读取即可
+        with open(source, "rb") as f:
+            return f.read()
+
+    def get(self, path):
+        """返回 (数据, MIME类型, ETag)，不存在时返回 None"""
+        path = self.normalize(path)
+        if path is None:
+            return None
+        located = self.locate(path)
+        if located is None:
+            return None
+        source, etag = located
+
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[2] == etag:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = (self.read_file(source), guess_mime(path), etag)
+        if len(entry[0]) <= self.max_entry:
+            with self.lock:
+                previous = self.entries.pop(path, None)
+                if previous is not None:
+                    self.size -= len(previous[0])
+                self.entries[path] = entry
+                self.size += len(entry[0])
+                while self.size > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= len(evicted[0])
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def close(self):
+        self.clear()
+        if self.archive is not None:
+            self.archive.close()
+
+    def stats(self):
+        with self.lock:
+            return {"path": self.path, "hits": self.hits, "misses": self.misses,
+                    "cached": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+# 二进制数据的 dtype 名称与 memoryview 格式，JavaScript端对应同名的类型化数组
+BINARY_DTYPES = {
+    "int8": "b", "uint8": "B", "int16": "h", "uint16": "H", "int32": "i", "uint32": "I",
+    "int64": "q", "uint64": "Q", "float32": "f", "float64": "d",
+}
+
+
+def binary_view(obj):
+    """把 bytes / bytearray / memoryview / NumPy 数组转换为 (字节视图, dtype, shape)
+
+    连续的小端数据不复制，视图引用原对象；其他对象返回 None。
+    """
+    if hasattr(obj, "__array_interface__") and hasattr(obj, "dtype"):
+        # 不导入NumPy，按数组接口处理
+        if obj.dtype.byteorder == ">":
+            obj = obj.astype(obj.dtype.newbyteorder("<"))
+        if not obj.flags["C_CONTIGUOUS"]:
+            obj = obj.copy()
+        return memoryview(obj).cast("B"), obj.dtype.name, list(obj.shape)
+    if not isinstance(obj, (bytes, bytearray, memoryview)):
+        return None
+    
+    view = memoryview(obj)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes()).cast(view.format, view.shape)
+    code = view.format.lstrip("@=<")
+    if code in "bhilqn":
+        dtype = f"int{view.itemsize * 8}"
+    elif code in "BHILQN":
+        dtype = f"uint{view.itemsize * 8}"
+    elif code in "efd":
+        dtype = f"float{view.itemsize * 8}"
+    else:
+        dtype = "uint8"
+    shape = list(view.shape) if view.ndim else []
+    return view.cast("B"), dtype, shape
+
+
+def decode_binary(marker, blobs):
+    """把JavaScript上传的 {"__binary__": id, "dtype", "shape"} 转换为带类型和形状的 memoryview
+
+    可以直接传给 numpy.asarray 而不复制。上传失败时数据以 base64 字段内联。
+    """
+    if marker.get("base64") is not None:
+        data = base64.b64decode(marker["base64"])
+    else:
+        blob = blobs.get(marker["__binary__"])
+        if blob is None:
+            raise ValueError(f"Binary argument {marker['__binary__']} expired or not found")
+        blobs.release(marker["__binary__"])
+        data = blob[0]
+    view = memoryview(data)
+    fmt = BINARY_DTYPES.get(marker.get("dtype"))
+    if fmt is None:
+        return view
+    shape = marker.get("shape") or [view.nbytes // struct.calcsize(fmt)]
+    return view.cast(fmt, shape)
+
+
+class HyyUrlSchemeHandler(QWebEngineUrlSchemeHandler):
+    """处理 hyyhtml:// 请求，按主机名分发，例如 hyyhtml://blob/<id>
+
+    hyyhtml://runtime/hyyhtml.js 提供 qwebchannel.js 和桥接脚本，
+    hyyhtml://upload 接收JavaScript以POST上传的二进制参数，
+    通过 mount 挂载的应用包以 hyyhtml://<host>/<path> 访问。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.blobs = BlobStore()
+        self.bundles = {}
+        # 主机名 -> 挂载该应用包的窗口标识
+        self.owners = {}
+        self.runtime = None
+        self.routes = {"blob": self.serve_blob, "runtime": self.serve_runtime, "upload": self.serve_upload}
+        
+        # 定期清理过期数据
+        self.sweep_timer = QTimer(self)
+        self.sweep_timer.timeout.connect(self.blobs.sweep)
+        self.sweep_timer.start(5000)
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        route = self.routes.get(url.host())
+        if route is None:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        route(job, url.path().lstrip("/"))
+
+    def serve_blob(self, job, blob_id):
+        blob = self.blobs.get(blob_id)
+        if blob is None:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        data, mime = blob
+        self.reply(job, mime, data, {"Access-Control-Allow-Origin": "*"})
+        # hyyhtml://blob/<id>?once 读取一次后即释放
+        if job.requestUrl().query() == "once":
+            self.blobs.release(blob_id)
+
+    def serve_upload(self, job, path):
+        """保存POST请求体，响应内容为数据的标识"""
+        # Qt 6.7 之前无法读取请求体，JavaScript会改为内联base64
+        if bytes(job.requestMethod()) != b"POST" or not hasattr(job, "requestBody"):
+            job.fail(QWebEngineUrlRequestJob.Error.RequestDenied)
+            return
+        body = job.requestBody()
+        data = bytes(body.readAll()) if body is not None else b""
+        blob_id = self.blobs.add(data, "application/octet-stream")
+        self.reply(job, "text/plain", blob_id.encode(), {"Access-Control-Allow-Origin": "*"})
+
+    def mount(self, host, bundle, owner=None):
+        """把应用包挂载到 hyyhtml://<host>/，同一窗口挂载的同名旧包会被关闭
+
+        处理器由同一网页配置上的所有窗口共用，主机名已被其他窗口(owner)占用时抛出 ValueError。
+        """
+        if host in ("blob", "runtime", "upload"):
+            raise ValueError(f"Host is reserved: {host}")
+        if host in self.bundles and self.owners.get(host) != owner:
+            raise ValueError(f"Host '{host}' is already mounted by window '{self.owners.get(host)}'")
+        previous = self.bundles.get(host)
+        if previous is not None and previous is not bundle:
+            previous.close()
+        self.bundles[host] = bundle
+        self.owners[host] = owner
+        self.routes[host] = partial(self.serve_asset, bundle)
+        return f"hyyhtml://{host}/"
+
+    def serve_asset(self, bundle, job, path):
+        asset = bundle.get(path)
+        if asset is None:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        data, mime, _ = asset
+        # QWebEngineUrlRequestJob 无法回复304，不发送 ETag，缓存有效性由 AssetBundle 自己判断
+        self.reply(job, mime, data, {"Cache-Control": "no-cache"})
+
+    def serve_runtime(self, job, path):
+        if path != "hyyhtml.js":
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        if self.runtime is None:
+            source = QFile(":/qtwebchannel/qwebchannel.js")
+            source.open(QIODevice.OpenModeFlag.ReadOnly)
+            self.runtime = bytes(source.readAll()) + b"\n" + BRIDGE_JS.encode("utf-8")
+            source.close()
+        self.reply(job, "text/javascript", self.runtime)
+
+    def reply(self, job, mime, data, headers=None):
+        """把数据作为响应发送，缓冲区随请求一起释放"""
+        # Qt 6.8 之前不能设置额外的响应头
+        if headers and hasattr(job, "setAdditionalResponseHeaders"):
+            job.setAdditionalResponseHeaders({QByteArray(key.encode()): QByteArray(value.encode())
+                                              for key, value in headers.items()})
+        buffer = QBuffer(job)
+        buffer.setData(data if isinstance(data, (bytes, bytearray)) else bytes(data))
+        buffer.open(QBuffer.OpenModeFlag.ReadOnly)
+        job.reply(mime.encode() if isinstance(mime, str) else mime, buffer)
+
+
+def install_scheme_handler(profile):
+    """在网页配置上安装 hyyhtml:// 处理器，多个窗口共用同一个处理器"""
+    handler = profile.urlSchemeHandler(SCHEME)
+    if handler is None:
+        handler = HyyUrlSchemeHandler(profile)
+        profile.installUrlSchemeHandler(SCHEME, handler)
+    return handler
+
+
+class MainThreadInvoker(QObject):
+    """把工作线程中的回调投递回GUI线程执行"""
+    invoke = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        # 跨线程发射时自动变为排队连接，回调总是在GUI线程中运行
+        self.invoke.connect(self._run)
+
+    @pyqtSlot(object)
+    def _run(self, callback):
+        callback()
+
+
+class AsyncioLoop:
+    """运行 async def API函数的asyncio事件循环
+
+    事件循环运行在独立线程中，与 QApplication.exec() 并行工作：
+    协程在该线程中并发执行，结果经由 MainThreadInvoker 回到GUI线程，
+    因此成百上千个进行中的I/O调用也不会阻塞界面。
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        """启动事件循环线程(已启动时直接返回)"""
+        if self.loop is not None:
+            return self.loop
+        
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+            # 取消退出时仍未完成的协程
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+        
+        self.loop = loop
+        self.thread = threading.Thread(target=run, name="hyyhtml-asyncio", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return loop
+
+    def submit(self, coro):
+        """把协程提交到事件循环，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def stop(self):
+        """停止事件循环并等待线程退出"""
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+        self.loop = None
+        self.thread = None
+
+
+def _to_int(value):
+    """JavaScript的数字可能以浮点数形式到达，转换为整数"""
+    return value if isinstance(value, int) else int(value)
+
+
+def _to_bool(value):
+    """转换为布尔值，字符串 "false"、"0" 和空字符串为 False，无法识别的值报错"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("true", "1", "false", "0", ""):
+        return value.strip().lower() in ("true", "1")
+    raise ValueError(f"Cannot convert {value!r} to bool")
+
+
+# 根据参数注解预先选择的参数转换函数
+ARG_CONVERTERS = {
+    int: _to_int,
+    float: float,
+    bool: _to_bool,
+    str: str,
+}
+
+
+class DispatchEntry:
+    """调度表中的一项：目标函数、执行方式以及预先计算的参数信息"""
+    __slots__ = ("name", "func", "mode", "streaming", "min_args", "max_args", "converters", "cache", "limit",
+                 "priority", "single_flight")
+
+    def __init__(self, name, func, mode, cache=None, limit=None, priority="normal", single_flight=False):
+        self.name = name
+        self.func = func
+        self.mode = mode
+        self.cache = cache
+        # 同时执行的最大调用数，None 表示不限制，见 CallScheduler
+        self.limit = limit
+        self.priority = priority
+        # 参数相同的并发调用共享一次执行，见 SingleFlight
+        self.single_flight = single_flight
+        # 生成器和异步生成器的输出以流的形式分块发送
+        self.streaming = inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func)
+        
+        positional = []
+        varargs = False
+        for param in inspect.signature(func).parameters.values():
+            if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+                positional.append(param)
+            elif param.kind == param.VAR_POSITIONAL:
+                varargs = True
+        
+        self.min_args = sum(1 for param in positional if param.default is param.empty)
+        self.max_args = None if varargs else len(positional)
+        converters = tuple(ARG_CONVERTERS.get(param.annotation) for param in positional)
+        self.converters = converters if any(converters) else None
+
+    def convert(self, args):
+        """检查参数个数并按注解转换参数"""
+        count = len(args)
+        if count < self.min_args or (self.max_args is not None and count > self.max_args):
+            if self.max_args is None:
+                expected = f"at least {self.min_args}"
+            elif self.min_args == self.max_args:
+                expected = str(self.min_args)
+            else:
+                expected = f"{self.min_args} to {self.max_args}"
+            raise TypeError(f"'{self.name}' expects {expected} arguments, got {count}")
+        
+        if self.converters is None:
+            return args
+        return [convert(arg) if convert is not None and arg is not None else arg
+                for convert, arg in zip(self.converters, args)] + list(args[len(self.converters):])
+
+
+def make_api_options(func, executor=None, max_concurrency=None, priority="normal", single_flight=False):
+    """检查 @api 的参数并返回保存到 api_options 中的选项"""
+    if executor is not None and executor not in API_EXECUTORS:
+        raise ValueError(f"Unknown executor: {executor}")
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+    if executor == "process" and (inspect.iscoroutinefunction(func) or inspect.isgeneratorfunction(func)
+                                  or inspect.isasyncgenfunction(func)):
+        raise ValueError(f"'{func.__name__}' cannot run in a process pool")
+    if max_concurrency is not None and max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    if single_flight and (inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func)):
+        raise ValueError(f"Streaming function '{func.__name__}' cannot use single_flight")
+    return {"executor": executor, "max_concurrency": max_concurrency, "priority": priority,
+            "single_flight": bool(single_flight)}
+
+
+class PackedBuffer:
+    """在进程之间传递的 memoryview(memoryview 本身不能被pickle)"""
+    __slots__ = ("data", "format", "shape")
+
+    def __init__(self, view):
+        self.data = view.tobytes()
+        self.format = view.format
+        self.shape = tuple(view.shape)
+
+    def __getstate__(self):
+        return self.data, self.format, self.shape
+
+    def __setstate__(self, state):
+        self.data, self.format, self.shape = state
+
+    def unpack(self):
+        return memoryview(self.data).cast("B").cast(self.format, self.shape)
+
+
+def pack_buffer(value):
+    return PackedBuffer(value) if isinstance(value, memoryview) else value
+
+
+def unpack_buffer(value):
+    return value.unpack() if isinstance(value, PackedBuffer) else value
+
+
+def call_in_process(func, args):
+    """在工作进程中执行API函数"""
+    return pack_buffer(func(*[unpack_buffer(arg) for arg in args]))
+
+
+def warm_worker():
+    return os.getpid()
+
+
+class ProcessPool:
+    """执行 executor="process" 的API函数的进程池
+
+    占用GIL的计算不会拖慢GUI线程。工作进程以 spawn 方式启动并在首次使用(或 warm)时预热，
+    函数和参数通过pickle传递，因此API函数必须定义在模块顶层，主脚本需要 if __name__ == "__main__" 保护。
+    每个函数同时执行的调用数由 CallScheduler 限制。
+    工作进程崩溃时进行中的调用以错误返回，进程池在下次调用时重建。
+    只在GUI线程中使用。
+    """
+
+    def __init__(self, invoker, max_workers=None):
+        self.invoker = invoker
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = None
+        # 进程池每重建一次加一，同一次崩溃只处理一次
+        self.generation = 0
+        self.running = {}
+        self.busy = 0
+        self.busy_time = 0.0
+        self.started = None
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.crashes = 0
+
+    def start(self):
+        """创建进程池并让每个工作进程完成启动"""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            self.generation += 1
+            if self.started is None:
+                self.started = time.perf_counter()
+            for _ in range(self.max_workers):
+                self.executor.submit(warm_worker)
+        return self.executor
+
+    def submit(self, entry, args, done, started=None):
+        """执行 entry.func(*args)，完成后在GUI线程中调用 done(future)
+
+        started(future) 在调用交给进程池后调用，取消该 future 可以丢弃尚未开始的调用
+        (已在工作进程中运行的调用无法中断)
+        """
+        name = entry.name
+        args = [pack_buffer(arg) for arg in args]
+        try:
+            future = self.start().submit(call_in_process, entry.func, args)
+        except BrokenProcessPool:
+            self.restart(self.generation)
+            future = self.start().submit(call_in_process, entry.func, args)
+
+        self.running[name] = self.running.get(name, 0) + 1
+        self.busy += 1
+        if started is not None:
+            started(future)
+        begin = time.perf_counter()
+        generation = self.generation
+        future.add_done_callback(lambda f: self.invoker.invoke.emit(
+            lambda: self.finished(entry, f, done, begin, generation)))
+
+    def finished(self, entry, future, done, begin, generation):
+        self.running[entry.name] -= 1
+        self.busy -= 1
+        self.busy_time += time.perf_counter() - begin
+        if future.cancelled():
+            self.cancelled += 1
+        elif future.exception() is None:
+            self.completed += 1
+        else:
+            self.failed += 1
+            if isinstance(future.exception(), BrokenProcessPool):
+                self.restart(generation)
+        done(future)
+
+    def restart(self, generation):
+        """工作进程崩溃后丢弃进程池，下次调用时重建"""
+        if generation != self.generation or self.executor is None:
+            return
+        logger.error("A process pool worker died, restarting the pool")
+        self.crashes += 1
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        return {
+            "workers": self.max_workers if self.executor is not None else 0,
+            "busy": self.busy,
+            "running": {name: count for name, count in self.running.items() if count},
+            "utilization": round(min(1.0, self.busy_time / (elapsed * self.max_workers)), 4) if elapsed else 0.0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "crashes": self.crashes,
+            "restarts": max(0, self.generation - 1),
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class TimerScheduler(QObject):
+    """用一个 QTimer 驱动所有定时任务
+
+    到期时间相差不超过 tolerance_ms 的任务在同一次唤醒中执行。
+    单次任务执行前即从登记表中删除，重复任务按间隔重新排期，
+    因此不会像每次调用都新建 QTimer 那样无限累积定时器对象。
+    """
+
+    def __init__(self, timers, parent=None, tolerance_ms=4):
+        super().__init__(parent)
+        # timer_id -> 任务信息，与 Window.timers 是同一个字典
+        self.timers = timers
+        self.tolerance_ms = tolerance_ms
+        self.heap = []
+        self.ids = itertools.count(1)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.fire)
+
+    def schedule(self, delay_ms, callback, name, repeat=False):
+        """登记任务并返回其标识；repeat 为 True 时每隔 delay_ms 执行一次"""
+        if delay_ms < 0 or (repeat and delay_ms <= 0):
+            raise ValueError(f"Invalid timer delay: {delay_ms}ms")
+        if repeat:
+            # 间隔不超过容差的重复任务会在同一次唤醒中反复到期
+            delay_ms = max(delay_ms, self.tolerance_ms + 1)
+        timer_id = next(self.ids)
+        due = time.monotonic() + delay_ms / 1000
+        self.timers[timer_id] = {
+            "id": timer_id,
+            "function": name,
+            "interval": delay_ms,
+            "repeat": repeat,
+            "due": due,
+            "callback": callback,
+        }
+        heapq.heappush(self.heap, (due, timer_id))
+        self.arm()
+        return timer_id
+
+    def cancel(self, timer_id):
+        """取消任务，任务不存在时返回 False"""
+        if self.timers.pop(timer_id, None) is None:
+            return False
+        self.arm()
+        return True
+
+    def pending(self):
+        """按下次执行时间排列的待执行任务"""
+        now = time.monotonic()
+        return [{"id": timer["id"],
+                 "function": timer["function"],
+                 "interval": timer["interval"],
+                 "repeat": timer["repeat"],
+                 "next_fire_ms": max(0, round((timer["due"] - now) * 1000, 3))}
+                for timer in sorted(self.timers.values(), key=lambda timer: timer["due"])]
+
+    def arm(self):
+        """让 QTimer 在最早的任务到期时唤醒"""
+        # 丢弃已取消或已重新排期的堆顶项
+        while self.heap:
+            due, timer_id = self.heap[0]
+            timer = self.timers.get(timer_id)
+            if timer is not None and timer["due"] == due:
+                break
+            heapq.heappop(self.heap)
+        
+        if not self.heap:
+            self.timer.stop()
+            return
+        delay = max(0, int((self.heap[0][0] - time.monotonic()) * 1000))
+        self.timer.start(delay)
+
+    def fire(self):
+        """执行所有已到期(含容差范围内)的任务，每个任务每次唤醒最多执行一次"""
+        deadline = time.monotonic() + self.tolerance_ms / 1000
+        due_timers = []
+        rescheduled = []
+        while self.heap and self.heap[0][0] <= deadline:
+            due, timer_id = heapq.heappop(self.heap)
+            timer = self.timers.get(timer_id)
+            if timer is None or timer["due"] != due:
+                continue
+            if timer["repeat"]:
+                # 错过的周期不补执行；下次到期时间在本轮结束后才放回堆中
+                timer["due"] = max(due + timer["interval"] / 1000, time.monotonic())
+                rescheduled.append((timer["due"], timer_id))
+            else:
+                del self.timers[timer_id]
+            due_timers.append(timer)
+        for item in rescheduled:
+            heapq.heappush(self.heap, item)
+        
+        for timer in due_timers:
+            try:
+                timer["callback"]()
+            except Exception as e:
+                logger.error(f"Error in timer {timer['id']} ({timer['function']}): {str(e)}")
+        self.arm()
+
+
+class LogBuffer:
+    """缓冲发往JavaScript控制台的日志，按固定间隔合并成一次发送
+
+    日志以 [时间戳毫秒, 级别, 消息] 的JSON数组通过 logBatchToJS 送达，
+    不拼接JavaScript代码，因此消息中的引号和换行都是安全的。
+    可以在任意线程中调用 add。
+    """
+
+    def __init__(self, bridge, interval_ms=16, capacity=1000):
+        self.bridge = bridge
+        self.interval_ms = interval_ms
+        self.lock = threading.Lock()
+        # 超出容量时丢弃最早的日志
+        self.entries = deque(maxlen=capacity)
+        self.dropped = 0
+        self.scheduled = False
+
+    def add(self, level, message):
+        with self.lock:
+            if len(self.entries) == self.entries.maxlen:
+                self.dropped += 1
+            self.entries.append((round(time.time() * 1000), level, str(message)))
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.bridge.invoker.invoke.emit(self.schedule)
+
+    def schedule(self):
+        QTimer.singleShot(self.interval_ms, self.flush)
+
+    def flush(self):
+        """把缓冲的日志一次性发送给JavaScript"""
+        with self.lock:
+            entries = list(self.entries)
+            self.entries.clear()
+            dropped, self.dropped = self.dropped, 0
+            self.scheduled = False
+        
+        if dropped:
+            entries.insert(0, (round(time.time() * 1000), "warning", f"{dropped} log messages dropped"))
+        if entries:
+            self.bridge.logBatchToJS.emit(json.dumps(entries))
+
+
+class EventBus:
+    """Python发往JavaScript的主题事件
+
+    只有JavaScript通过 hyyhtml.on 订阅过的主题才会发送，没有订阅者的事件直接丢弃。
+    事件按帧间隔合并成一次 eventsToJS 发送，格式为 [[主题, 数据], ...]；
+    通过 coalesce 标记的主题在一帧内只保留最新的值。
+    可以在任意线程中调用 emit。
+    """
+
+    def __init__(self, bridge, interval_ms=16):
+        self.bridge = bridge
+        self.interval_ms = interval_ms
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.coalesced = set()
+        # 主题 -> 订阅状态变化时在GUI线程中调用的函数
+        self.watchers = {}
+        # [[主题, JSON数据], ...]，合并主题在 latest 中记录其位置
+        self.queue = []
+        self.latest = {}
+        self.scheduled = False
+        self.emitted = 0
+        self.skipped = 0
+        self.merged = 0
+        self.deliveries = 0
+
+    def subscribe(self, topic, subscribed):
+        with self.lock:
+            if subscribed:
+                self.subscriptions.add(topic)
+            else:
+                self.subscriptions.discard(topic)
+        watcher = self.watchers.get(topic)
+        if watcher is not None:
+            watcher(subscribed)
+
+    def watch(self, topic, callback):
+        """主题被订阅或取消订阅时调用 callback(subscribed)"""
+        self.watchers[topic] = callback
+
+    def subscribed(self, topic):
+        with self.lock:
+            return topic in self.subscriptions
+
+    def coalesce(self, topic, enabled=True):
+        with self.lock:
+            if enabled:
+                self.coalesced.add(topic)
+            else:
+                self.coalesced.discard(topic)
+                self.latest.pop(topic, None)
+
+    def emit(self, topic, payload):
+        """排队一个事件，返回是否有订阅者
+
+        数据在调用时序列化，无法转换为JSON时在调用方抛出异常。
+        """
+        with self.lock:
+            if topic not in self.subscriptions:
+                self.skipped += 1
+                return False
+        data = json.dumps(payload)
+
+        with self.lock:
+            self.emitted += 1
+            index = self.latest.get(topic)
+            if index is not None:
+                self.queue[index][1] = data
+                self.merged += 1
+            else:
+                if topic in self.coalesced:
+                    self.latest[topic] = len(self.queue)
+                self.queue.append([topic, data])
+            if self.scheduled:
+                return True
+            self.scheduled = True
+        self.bridge.invoker.invoke.emit(self.schedule)
+        return True
+
+    def schedule(self):
+        QTimer.singleShot(self.interval_ms, self.flush)
+
+    def flush(self):
+        """把排队的事件一次性发送给JavaScript"""
+        with self.lock:
+            queue, self.queue = self.queue, []
+            self.latest.clear()
+            self.scheduled = False
+            if not queue:
+                return
+            self.deliveries += 1
+        
+        self.bridge.eventsToJS.emit(
+            "[" + ",".join(f"[{json.dumps(topic)},{data}]" for topic, data in queue) + "]")
+
+    def reset(self):
+        """页面重新加载后旧的订阅和未发送的事件都已失效"""
+        with self.lock:
+            self.subscriptions.clear()
+            self.queue = []
+            self.latest.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"subscriptions": sorted(self.subscriptions), "coalesced": sorted(self.coalesced),
+                    "emitted": self.emitted, "skipped": self.skipped, "merged": self.merged,
+                    "deliveries": self.deliveries, "pending": len(self.queue)}
+
+
+def split_pointer(path):
+    """把JSON指针 /a/b/0 拆分为 ["a", "b", "0"]，空字符串表示整个状态"""
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise ValueError(f"Invalid state path: {path}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+
+def join_pointer(parts):
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in parts)
+
+
+def pointers_overlap(a, b):
+    """两个路径是否相同或互为祖先"""
+    return a == b or a.startswith(b + "/") or b.startswith(a + "/") or not a or not b
+
+
+def apply_patch_op(document, op):
+    """把一个 {"op", "path", "value"} 操作应用到文档上，返回新的根对象
+
+    op 为 add / replace / remove，与JSON Patch相同；
+    对象中 replace 不存在的键时直接添加，remove 不存在的键时忽略；
+    add / replace 时缺少的中间层创建为空对象，中间层不是对象或数组时抛出 ValueError。
+    """
+    parts = split_pointer(op["path"])
+    kind = op["op"]
+    if kind not in ("add", "replace", "remove"):
+        raise ValueError(f"Unknown patch op: {kind}")
+    if not parts:
+        return {} if kind == "remove" else op["value"]
+    
+    parent = document
+    for part in parts[:-1]:
+        if isinstance(parent, dict) and part not in parent:
+            if kind == "remove":
+                return document
+            parent[part] = {}
+        parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+        if not isinstance(parent, (dict, list)):
+            raise ValueError(f"Cannot {kind} {op['path']}: {part} is not an object or array")
+    key = parts[-1]
+    if isinstance(parent, list):
+        index = len(parent) if key == "-" else int(key)
+        if kind == "remove":
+            del parent[index]
+        elif kind == "add" or index == len(parent):
+            parent.insert(index, op["value"])
+        else:
+            parent[index] = op["value"]
+    elif kind == "remove":
+        parent.pop(key, None)
+    else:
+        parent[key] = op["value"]
+    return document
+
+
+def diff_values(old, new, path="", ops=None):
+    """生成把 old 变为 new 的最少操作，只包含变化的部分"""
+    ops = [] if ops is None else ops
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": path + join_pointer([key])})
+        for key, value in new.items():
+            child = path + join_pointer([key])
+            if key in old:
+                diff_values(old[key], value, child, ops)
+            else:
+                ops.append({"op": "add", "path": child, "value": value})
+    elif isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        for index in range(common):
+            diff_values(old[index], new[index], f"{path}/{index}", ops)
+        for value in new[common:]:
+            ops.append({"op": "add", "path": f"{path}/-", "value": value})
+        # 从末尾开始删除，前面的下标保持不变
+        for index in range(len(old) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{index}"})
+    elif type(old) is not type(new) or old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
+    return ops
+
+
+class StateStore:
+    """在Python和JavaScript之间同步的键值状态
+
+    状态是一个JSON对象，任何一方的修改都以JSON Patch风格的增量
+    ([{"op", "path", "value"}, ...]) 发送给另一方，同一轮事件中的修改合并为一批。
+    Python端是权威副本，每应用一批修改版本号加一。JavaScript发送修改时附带它所基于的版本，
+    若该版本之后Python端修改过重叠的路径，则拒绝这批修改并把完整快照发回JavaScript重新同步。
+    可以在任意线程中读写。
+    """
+
+    def __init__(self, bridge, history=256):
+        self.bridge = bridge
+        self.lock = threading.RLock()
+        self.data = {}
+        self.version = 0
+        # Python端尚未发送的操作
+        self.pending = []
+        # (版本, 来源, 修改的路径)，用于判断JavaScript的修改是否冲突
+        self.history = deque(maxlen=history)
+        self.watchers = []
+        self.scheduled = False
+        self.sent = 0
+        self.received = 0
+        self.conflicts = 0
+        self.bytes_sent = 0
+
+    def lookup(self, path):
+        """返回路径上的值本身(不复制)，不存在时抛出 KeyError"""
+        value = self.data
+        try:
+            for part in split_pointer(path):
+                value = value[int(part)] if isinstance(value, list) else value[part]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise KeyError(path) from None
+        return value
+
+    def get(self, path="", default=None):
+        """读取路径上的值，返回副本"""
+        with self.lock:
+            try:
+                return json.loads(json.dumps(self.lookup(path)))
+            except KeyError:
+                return default
+
+    def set(self, path, value):
+        """设置路径上的值，只有与旧值不同的部分会发送给JavaScript，返回生成的操作"""
+        # 复制一份，调用方之后修改原对象不会影响状态
+        value = json.loads(json.dumps(value))
+        with self.lock:
+            try:
+                ops = diff_values(self.lookup(path), value, path)
+            except KeyError:
+                ops = [{"op": "add", "path": path, "value": value}]
+            self.commit(ops)
+        return ops
+
+    def update(self, values):
+        """批量设置顶层键"""
+        for key, value in values.items():
+            self.set(join_pointer([key]), value)
+
+    def remove(self, path):
+        with self.lock:
+            if self.exists(path):
+                self.commit([{"op": "remove", "path": path}])
+
+    def exists(self, path):
+        with self.lock:
+            try:
+                self.lookup(path)
+            except KeyError:
+                return False
+            return True
+
+    def commit(self, ops):
+        if not ops:
+            return
+        with self.lock:
+            for op in ops:
+                # 状态中保存副本，之后的修改不会改变排队中的操作
+                self.data = apply_patch_op(self.data, json.loads(json.dumps(op)))
+            self.pending.extend(ops)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.bridge.invoker.invoke.emit(self.schedule)
+
+    def schedule(self):
+        QTimer.singleShot(0, self.flush)
+
+    def flush(self):
+        """把排队的修改作为一个新版本发送给JavaScript"""
+        with self.lock:
+            ops, self.pending = self.pending, []
+            self.scheduled = False
+            if not ops:
+                return
+            self.version += 1
+            self.history.append((self.version, "python", [op["path"] for op in ops]))
+            message = {"kind": "patch", "source": "python", "base": self.version - 1,
+                       "version": self.version, "ops": ops}
+        self.send(message)
+        self.notify(ops, "python")
+
+    def receive(self, message):
+        """应用JavaScript发送的修改: {"id", "base", "ops"}"""
+        # 先为Python端排队的修改分配版本，冲突检测才能看到它们
+        self.flush()
+        self.received += 1
+        ops = message["ops"]
+        with self.lock:
+            if self.conflicting(message["base"], ops):
+                logger.warning(f"State patch based on version {message['base']} conflicts, resyncing")
+                self.resync(message.get("id"))
+                return
+            
+            try:
+                for op in ops:
+                    self.data = apply_patch_op(self.data, op)
+            except (KeyError, IndexError, ValueError, TypeError) as e:
+                # 可能已应用了一部分，快照让两端回到一致
+                logger.warning(f"Invalid state patch ({e}), resyncing")
+                self.resync(message.get("id"))
+                return
+            
+            self.version += 1
+            self.history.append((self.version, "js", [op["path"] for op in ops]))
+            # JavaScript已经应用了这些修改，只需确认新版本
+            self.send({"kind": "ack", "id": message.get("id"),
+                       "base": self.version - 1, "version": self.version})
+        self.notify(ops, "js")
+
+    def conflicting(self, base, ops):
+        """base 之后Python端是否修改过与 ops 重叠的路径"""
+        if base > self.version:
+            return True
+        if base == self.version:
+            return False
+        if not self.history or self.history[0][0] > base + 1:
+            # 历史记录不足以判断
+            return True
+        paths = [op["path"] for op in ops]
+        return any(pointers_overlap(changed, path)
+                   for version, source, changed_paths in self.history
+                   if version > base and source != "js"
+                   for changed in changed_paths for path in paths)
+
+    def resync(self, rejected):
+        """拒绝一批修改并发送快照
+
+        新版本在历史中记为修改了整个状态，JavaScript在收到快照之前发出的修改都会被拒绝，
+        因此被丢弃的本地修改不会在Python端生效。
+        """
+        with self.lock:
+            self.conflicts += 1
+            self.version += 1
+            self.history.append((self.version, "sync", [""]))
+            self.send_snapshot(rejected)
+
+    def send_snapshot(self, rejected=None):
+        """把完整状态发给JavaScript，用于初次同步和冲突后的重新同步"""
+        # 快照已包含排队中的修改，先为它们分配版本，避免JavaScript重复应用
+        self.flush()
+        with self.lock:
+            message = {"kind": "snapshot", "version": self.version, "data": self.data}
+            if rejected is not None:
+                message["rejected"] = rejected
+            self.send(message)
+
+    def send(self, message):
+        payload = json.dumps(message)
+        self.sent += 1
+        self.bytes_sent += len(payload)
+        self.bridge.stateToJS.emit(payload)
+
+    def watch(self, callback):
+        """状态变化时在GUI线程中调用 callback(ops, source)，source 为 "python" 或 "js"
+
+        返回取消监听的函数
+        """
+        self.watchers.append(callback)
+        return lambda: self.watchers.remove(callback)
+
+    def notify(self, ops, source):
+        for callback in list(self.watchers):
+            try:
+                callback(ops, source)
+            except Exception as e:
+                logger.error(f"Error in state watcher: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {"version": self.version, "keys": len(self.data) if isinstance(self.data, dict) else 0,
+                    "sent": self.sent, "received": self.received, "conflicts": self.conflicts,
+                    "bytes_sent": self.bytes_sent}
+
+
+class WindowStateStream:
+    """把窗口位置、大小和状态的变化推送给订阅了 "window" 主题的JavaScript
+
+    订阅时先发送完整快照，之后只发送变化的字段。
+    两次发送至少间隔 interval_ms，期间的变化合并到间隔结束时发送。
+    没有订阅者时不做任何事。
+    """
+
+    def __init__(self, window, topic="window", interval_ms=50):
+        self.window = window
+        self.topic = topic
+        self.interval_ms = interval_ms
+        self.last = {}
+        self.dirty = False
+        self.timer = QTimer(window)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        window.bridge.events.watch(topic, self.subscribed)
+
+    def subscribed(self, subscribed):
+        # 新的订阅者需要完整快照
+        self.last = {}
+        if subscribed:
+            self.changed()
+
+    def changed(self):
+        if not self.window.bridge.events.subscribed(self.topic):
+            return
+        if self.timer.isActive():
+            self.dirty = True
+            return
+        self.send()
+        self.timer.start(self.interval_ms)
+
+    def flush(self):
+        if self.dirty:
+            self.dirty = False
+            self.send()
+            self.timer.start(self.interval_ms)
+
+    def send(self):
+        snapshot = self.window.window_snapshot()
+        delta = {key: value for key, value in snapshot.items() if self.last.get(key) != value}
+        if delta:
+            self.last = snapshot
+            self.window.emit(self.topic, delta)
+
+
+class BridgeStream:
+    """把生成器或异步生成器的输出按JavaScript授予的额度分块推送
+
+    JavaScript每消费一部分数据就通过 streamCreditRequested 授予新的额度，
+    额度用完后不再拉取生成器，快速的生产者不会淹没传输通道和渲染进程内存。
+    """
+
+    def __init__(self, bridge, streamId, funcName, iterator, mode):
+        self.bridge = bridge
+        self.streamId = streamId
+        self.funcName = funcName
+        self.iterator = iterator
+        self.mode = mode
+        self.credits = 0
+        self.pulling = False
+        self.closed = False
+
+    def grant(self, credits):
+        """JavaScript授予新的额度"""
+        self.credits += credits
+        self.pump()
+
+    def pump(self):
+        """额度允许时拉取下一批数据"""
+        if self.pulling or self.closed or self.credits <= 0:
+            return
+        self.pulling = True
+        
+        if self.mode == "main":
+            # GUI线程中的生成器一次拉取全部额度，合并成一次发送
+            try:
+                chunks, done = self.pull(self.credits)
+            except Exception as e:
+                self.fail(e)
+                return
+            self.deliver(chunks, done)
+            return
+        
+        if self.mode == "async":
+            future = self.bridge.async_loop.submit(self.pull_async())
+        else:
+            future = self.bridge.thread_pool().submit(self.pull, 1)
+        future.add_done_callback(
+            lambda f: self.bridge.invoker.invoke.emit(lambda: self.finish_pull(f)))
+
+    def pull(self, limit):
+        """从生成器中取出最多 limit 项，返回 (JSON片段列表, 是否结束)"""
+        chunks = []
+        for _ in range(limit):
+            try:
+                item = next(self.iterator)
+            except StopIteration:
+                return chunks, True
+            chunks.append(self.bridge.encode(item))
+        return chunks, False
+
+    async def pull_async(self):
+        """从异步生成器中取出一项"""
+        try:
+            item = await self.iterator.__anext__()
+        except StopAsyncIteration:
+            return [], True
+        return [self.bridge.encode(item)], False
+
+    def finish_pull(self, future):
+        """在GUI线程中处理工作线程或事件循环的拉取结果"""
+        try:
+            chunks, done = future.result()
+        except Exception as e:
+            self.fail(e)
+            return
+        self.deliver(chunks, done)
+
+    def deliver(self, chunks, done):
+        """把拉取到的数据发送给JavaScript"""
+        self.pulling = False
+        if self.closed:
+            # 拉取期间被取消
+            self.close_iterator()
+            return
+        
+        if chunks:
+            self.credits -= len(chunks)
+            self.bridge.streamToJS.emit(self.streamId, "data", "[" + ",".join(chunks) + "]")
+        if done:
+            self.bridge.streamToJS.emit(self.streamId, "end", "null")
+            self.finish()
+        else:
+            self.pump()
+
+    def fail(self, error):
+        """生成器抛出异常，通知JavaScript并结束流"""
+        self.pulling = False
+        logger.error(f"Error streaming {self.funcName}: {str(error)}")
+        self.bridge.streamToJS.emit(self.streamId, "error", json.dumps({"error": str(error)}))
+        self.finish()
+
+    def cancel(self):
+        """JavaScript停止消费，关闭生成器"""
+        self.closed = True
+        if not self.pulling:
+            self.close_iterator()
+
+    def close_iterator(self):
+        if inspect.isasyncgen(self.iterator):
+            self.bridge.async_loop.submit(self.iterator.aclose())
+        else:
+            self.iterator.close()
+
+    def finish(self):
+        self.closed = True
+        self.bridge.streams.pop(self.streamId, None)
+
+
+def canonical_args(args):
+    """参数的规范化JSON，整数值的浮点数按整数输出"""
+    args = [int(arg) if isinstance(arg, float) and arg.is_integer() else arg for arg in args]
+    return json.dumps(args, sort_keys=True, separators=(",", ":"))
+
+
+class ResultCache:
+    """缓存一个函数已序列化的JSON结果，按LRU淘汰并可设置过期时间
+
+    命中时既不执行函数也不重新编码JSON。只在GUI线程中使用。
+    """
+
+    def __init__(self, maxsize=128, ttl=None, key=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.key = key
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, args):
+        """由参数生成缓存键，默认使用规范化的JSON
+
+        JavaScript不区分 42 和 42.0，整数值的浮点数按整数生成键；
+        含二进制参数(memoryview)时返回 None，这次调用不使用缓存
+        """
+        if self.key is not None:
+            return self.key(*args)
+        if any(isinstance(arg, memoryview) for arg in args):
+            return None
+        return canonical_args(args)
+
+    def get(self, key):
+        """返回缓存的JSON文本，未命中或已过期时返回 None"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            payload, expires = entry
+            if expires is None or expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return payload
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, payload):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        self.entries[key] = (payload, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def storing_reply(self, key, reply):
+        """包装 reply，在成功返回结果的同时写入缓存"""
+        def store(callbackId, success, result):
+            # 二进制数据读取一次后即释放，不能缓存；子串只用于快速排除，再按解码后的结构确认
+            if success and ('"__binary__"' not in result or not binary_ids(json.loads(result))):
+                self.put(key, result)
+            reply(callbackId, success, result)
+        return store
+
+    def invalidate(self, key=None):
+        """删除一个键，key 为 None 时清空缓存"""
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries),
+                "maxsize": self.maxsize, "ttl": self.ttl}
+
+
+class SingleFlight:
+    """合并函数名和参数都相同的进行中调用
+
+    在调用进入优先级通道之前合并：第一个调用正常排队执行，其余调用不占用并发名额，
+    只作为可取消的等待中调用登记在 JSBridge.pending 中。结果(已序列化的JSON)到达后原样发给所有等待者，
+    结果中的二进制数据按等待者数量增加引用计数。
+    第一个调用被JavaScript取消或超时时，等待者重新通过调度器排队，由其中第一个重新执行；
+    页面重新加载时等待者和第一个调用一起被取消。只在GUI线程中使用。
+    """
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+        # (函数名, 参数JSON) -> [(等待的调用, 调度表项), ...]
+        self.flights = {}
+        self.executions = 0
+        self.shared = 0
+
+    def join(self, call, entry):
+        """有相同的调用正在执行时登记为等待者并返回 True，否则让 call 成为执行者
+
+        按注解转换后的参数比较，单独调用中的 42.0 和批量调用中的 42 视为相同
+        """
+        try:
+            args = entry.convert(call.args)
+        except Exception:
+            # 参数有误的调用不合并，由 dispatch 报告错误
+            return False
+        key = (entry.name, canonical_args(args))
+        followers = self.flights.get(key)
+        if followers is not None:
+            followers.append((call, call.reply))
+            self.bridge.track_pending(call)
+            self.shared += 1
+            return True
+        self.flights[key] = []
+        self.executions += 1
+        reply = call.reply
+
+        def fan_out(callbackId, success, result):
+            followers = self.flights.pop(key, [])
+            reply(callbackId, success, result)
+            # 已被取消的等待者不再在 pending 中
+            waiting = [(follower, follower_reply) for follower, follower_reply in followers
+                       if self.bridge.pending.pop(follower.callbackId, None) is not None]
+            if not waiting:
+                return
+            token = call.token
+            if token is not None and token.cancelled and token.reason != "reload":
+                # 只有执行者放弃了调用，等待者重新排队
+                self.shared -= len(waiting)
+                for follower, follower_reply in waiting:
+                    follower.reply = follower_reply
+                    follower.token = None
+                    self.bridge.scheduler.submit(follower)
+                return
+            if success and '"__binary__"' in result:
+                blobs = self.bridge.window.scheme_handler.blobs
+                for blob_id in binary_ids(json.loads(result)):
+                    for _ in waiting:
+                        blobs.retain(blob_id)
+            for follower, follower_reply in waiting:
+                follower_reply(follower.callbackId, success, result)
+
+        call.reply = fan_out
+        return False
+
+    def stats(self):
+        return {"in_flight": len(self.flights), "executions": self.executions, "shared": self.shared}
+
+
+def binary_ids(value):
+    """列出已解码的结果中所有二进制数据的标识"""
+    if isinstance(value, dict):
+        if "__binary__" in value:
+            return [value["__binary__"]]
+        return [blob_id for item in value.values() for blob_id in binary_ids(item)]
+    if isinstance(value, list):
+        return [blob_id for item in value for blob_id in binary_ids(item)]
+    return []
+
+
+class BridgeCall:
+    """一次来自JavaScript的函数调用"""
+    __slots__ = ("funcName", "args", "callbackId", "reply", "received", "started", "token", "future")
+
+    def __init__(self, funcName, args, callbackId, reply):
+        self.funcName = funcName
+        self.args = args
+        self.callbackId = callbackId
+        # reply(callbackId, success, result) 负责把JSON结果送回JavaScript
+        self.reply = reply
+        # 启用统计时记录收到调用和开始执行的时间
+        self.received = None
+        self.started = None
+        # 在GUI线程之外执行的调用可以被JavaScript取消，见 JSBridge.track_pending
+        self.token = None
+        self.future = None
+
+
+# 延迟直方图的桶上界(秒)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """固定桶的延迟直方图"""
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """按桶上界估计分位数(秒)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def cumulative(self):
+        """Prometheus格式的累计桶 [(上界, 数量), ...]"""
+        result = []
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            seen += count
+            result.append((bound, seen))
+        return result
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): seen
+                        for bound, seen in self.cumulative()},
+        }
+
+
+class FunctionMetrics:
+    """单个函数的调用统计"""
+    __slots__ = ("calls", "errors", "latency", "queue_wait", "request_bytes", "response_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+        self.queue_wait = Histogram()
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+
+class BridgeMetrics:
+    """桥接调用的统计：调用次数、错误数、执行延迟、排队等待和请求/响应大小
+
+    未启用时 JSBridge.dispatch 只多做一次布尔判断。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.functions = {}
+        self.since = time.time()
+
+    def track(self, call):
+        """开始跟踪一次调用，包装 call.reply 以在返回时记录结果
+
+        经过 CallScheduler 的调用在进入通道时已记录收到时间，排队等待计入 queue_wait。
+        """
+        if call.received is None:
+            call.received = time.perf_counter()
+        request_bytes = len(json.dumps(call.args))
+        reply = call.reply
+        
+        def record(callbackId, success, result):
+            self.record(call, success, request_bytes, len(result))
+            reply(callbackId, success, result)
+        
+        call.reply = record
+
+    def record(self, call, success, request_bytes, response_bytes):
+        now = time.perf_counter()
+        started = call.started if call.started is not None else now
+        with self.lock:
+            metrics = self.functions.get(call.funcName)
+            if metrics is None:
+                metrics = self.functions[call.funcName] = FunctionMetrics()
+            metrics.calls += 1
+            if not success:
+                metrics.errors += 1
+            metrics.latency.observe(now - started)
+            metrics.queue_wait.observe(max(0.0, started - call.received))
+            metrics.request_bytes += request_bytes
+            # json.dumps 默认只输出ASCII，字符数即字节数
+            metrics.response_bytes += response_bytes
+
+    def reset(self):
+        with self.lock:
+            self.functions.clear()
+            self.since = time.time()
+
+    def snapshot(self):
+        """各函数统计的JSON快照"""
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "since": self.since,
+                "functions": {
+                    name: {
+                        "calls": metrics.calls,
+                        "errors": metrics.errors,
+                        "latency": metrics.latency.snapshot(),
+                        "queue_wait": metrics.queue_wait.snapshot(),
+                        "request_bytes": metrics.request_bytes,
+                        "response_bytes": metrics.response_bytes,
+                    }
+                    for name, metrics in self.functions.items()
+                },
+            }
+
+    def prometheus(self):
+        """Prometheus文本格式的统计"""
+        lines = []
+        
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+        
+        with self.lock:
+            # 标签值需要转义反斜杠、双引号和换行
+            functions = sorted((function.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"), metrics)
+                               for function, metrics in self.functions.items())
+            for name, kind, text, value in (
+                    ("hyyhtml_bridge_calls_total", "counter", "Bridge calls per function.", "calls"),
+                    ("hyyhtml_bridge_errors_total", "counter", "Failed bridge calls per function.", "errors"),
+                    ("hyyhtml_bridge_request_bytes_total", "counter", "Serialized argument bytes.", "request_bytes"),
+                    ("hyyhtml_bridge_response_bytes_total", "counter", "Serialized result bytes.", "response_bytes")):
+                header(name, kind, text)
+                for function, metrics in functions:
+                    lines.append(f'{name}{{function="{function}"}} {getattr(metrics, value)}')
+            
+            for name, text, value in (
+                    ("hyyhtml_bridge_call_duration_seconds", "Execution latency per function.", "latency"),
+                    ("hyyhtml_bridge_queue_wait_seconds", "Time from receipt to execution start.", "queue_wait")):
+                header(name, "histogram", text)
+                for function, metrics in functions:
+                    histogram = getattr(metrics, value)
+                    for bound, seen in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f'{name}_bucket{{function="{function}",le="{le}"}} {seen}')
+                    lines.append(f'{name}_sum{{function="{function}"}} {histogram.total}')
+                    lines.append(f'{name}_count{{function="{function}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+class BatchReply:
+    """收集一个批量信封中同步完成的调用结果
+
+    信封处理完时由 flush 一次性发送已完成的结果；
+    之后才完成的调用(线程池、排队中的调用等)各自单独返回，不必等待同一信封中较慢的调用
+    """
+
+    def __init__(self, signal, single):
+        self.signal = signal
+        self.single = single
+        self.parts = []
+        self.collecting = True
+
+    def reply(self, callbackId, success, result):
+        if not self.collecting:
+            self.single(callbackId, success, result)
+            return
+        # result 已经是JSON文本，直接拼接避免二次编码
+        self.parts.append(f"[{json.dumps(callbackId)},{'true' if success else 'false'},{result}]")
+
+    def flush(self):
+        """发送信封处理期间已完成的结果"""
+        self.collecting = False
+        if self.parts:
+            self.signal.emit("[" + ",".join(self.parts) + "]")
+            self.parts = []
+
+
+class CallScheduler:
+    """按优先级通道(interactive / normal / bulk)调度JavaScript调用
+
+    Qt事件队列中已到达的调用先进入各自的通道，之后总是先执行 interactive 通道，
+    因此成批的 bulk 请求不会拖慢 set_position 之类的交互调用。
+    没有积压时 interactive 和 normal 调用立即执行，不增加延迟；
+    bulk 调用总是推迟到下一轮事件循环，每轮最多执行 slice_ms 毫秒，让新到达的调用有机会插队。
+    max_concurrency 限制同一函数同时执行(包括在线程池、进程池和事件循环中)的调用数，
+    达到上限的调用留在通道中，直到有调用执行结束(被取消但仍在运行的调用继续占用名额)。
+    只在GUI线程中使用。
+    """
+
+    def __init__(self, bridge, slice_ms=4):
+        self.bridge = bridge
+        self.slice = slice_ms / 1000
+        # 通道 -> [(调度表项, 调用, 入队时间), ...]
+        self.lanes = {lane: deque() for lane in PRIORITIES}
+        self.running = {}
+        self.scheduled = False
+        self.dispatched = dict.fromkeys(PRIORITIES, 0)
+        self.max_queued = dict.fromkeys(PRIORITIES, 0)
+        self.waits = {lane: Histogram() for lane in PRIORITIES}
+
+    def submit(self, call, lane=None):
+        """执行或排队一次调用，lane 覆盖函数自身的优先级通道"""
+        if self.bridge.metrics.enabled and call.received is None:
+            call.received = time.perf_counter()
+        entry = self.bridge.window.dispatch_table.get(call.funcName)
+        if entry is None:
+            # 由 dispatch 报告函数不存在
+            self.bridge.dispatch(call)
+            return
+        if entry.single_flight and self.bridge.flights.join(call, entry):
+            return
+        lane = lane or entry.priority
+        if lane != "bulk" and self.available(entry) and not self.backlog(lane):
+            self.run(entry, call, lane)
+            return
+        queue = self.lanes[lane]
+        queue.append((entry, call, time.perf_counter()))
+        self.max_queued[lane] = max(self.max_queued[lane], len(queue))
+        self.schedule()
+
+    def available(self, entry):
+        return entry.limit is None or self.running.get(entry.name, 0) < entry.limit
+
+    def backlog(self, lane):
+        """lane 及更高优先级的通道中是否有等待的调用"""
+        for name in PRIORITIES:
+            if self.lanes[name]:
+                return True
+            if name == lane:
+                return False
+        return False
+
+    def schedule(self):
+        if not self.scheduled:
+            self.scheduled = True
+            QTimer.singleShot(0, self.drain)
+
+    def drain(self):
+        """按优先级执行通道中的调用，超过时间片后让出事件循环"""
+        self.scheduled = False
+        deadline = time.perf_counter() + self.slice
+        while True:
+            item = self.next_runnable()
+            if item is None:
+                return
+            lane, (entry, call, queued) = item
+            self.run(entry, call, lane, queued)
+            if time.perf_counter() >= deadline:
+                break
+        self.schedule()
+
+    def next_runnable(self):
+        """取出优先级最高、且没有达到并发上限的调用，返回 (通道, 队列项)"""
+        for lane in PRIORITIES:
+            queue = self.lanes[lane]
+            for index, item in enumerate(queue):
+                if self.available(item[0]):
+                    del queue[index]
+                    return lane, item
+        return None
+
+    def run(self, entry, call, lane, queued=None):
+        self.dispatched[lane] += 1
+        self.waits[lane].observe(time.perf_counter() - queued if queued is not None else 0.0)
+        if entry.limit is not None:
+            name = entry.name
+            self.running[name] = self.running.get(name, 0) + 1
+            reply = call.reply
+
+            def free():
+                self.running[name] -= 1
+                if any(self.lanes.values()):
+                    self.schedule()
+
+            def release(callbackId, success, result):
+                reply(callbackId, success, result)
+                # 已回复取消的调用可能仍在线程池、进程池或事件循环中执行，执行结束后才让出名额
+                future = call.future
+                if future is None or future.done():
+                    free()
+                else:
+                    future.add_done_callback(lambda f: self.bridge.invoker.invoke.emit(free))
+
+            call.reply = release
+        self.bridge.dispatch(call, entry)
+
+    def discard(self, callbackId):
+        """从通道中移除尚未执行的调用，返回该调用"""
+        for queue in self.lanes.values():
+            for index, item in enumerate(queue):
+                if item[1].callbackId == callbackId:
+                    del queue[index]
+                    return item[1]
+        return None
+
+    def clear(self):
+        """移除所有尚未执行的调用并返回它们"""
+        calls = [item[1] for queue in self.lanes.values() for item in queue]
+        for queue in self.lanes.values():
+            queue.clear()
+        return calls
+
+    def stats(self):
+        return {
+            lane: {
+                "queued": len(self.lanes[lane]),
+                "max_queued": self.max_queued[lane],
+                "dispatched": self.dispatched[lane],
+                "wait": self.waits[lane].snapshot(),
+            }
+            for lane in PRIORITIES
+        }
+
+
 class JSBridge(QObject):
     callPythonRequested = pyqtSignal(str, list, str, arguments=['funcName', 'args', 'callbackId'])
     callbackToJS = pyqtSignal(str, bool, str, arguments=['callbackId', 'success', 'result'])
+    callPythonBatchRequested = pyqtSignal(str, arguments=['envelope'])
+    batchCallbackToJS = pyqtSignal(str, arguments=['results'])
+    cacheInvalidated = pyqtSignal(str, str, arguments=['funcName', 'args'])
+    streamToJS = pyqtSignal(str, str, str, arguments=['streamId', 'kind', 'data'])
+    streamCreditRequested = pyqtSignal(str, int, arguments=['streamId', 'credits'])
+    streamCancelRequested = pyqtSignal(str, arguments=['streamId'])
     pythonMessage = pyqtSignal(str, arguments=['message'])
+    pageReady = pyqtSignal()
+    pageActivated = pyqtSignal()
+    logBatchToJS = pyqtSignal(str, arguments=['entries'])
+    eventsToJS = pyqtSignal(str, arguments=['events'])
+    subscriptionRequested = pyqtSignal(str, bool, arguments=['topic', 'subscribed'])
+    stateToJS = pyqtSignal(str, arguments=['message'])
+    statePatchRequested = pyqtSignal(str, arguments=['message'])
+    stateSyncRequested = pyqtSignal()
+    callCancelRequested = pyqtSignal(str, str, arguments=['callbackId', 'reason'])
 
-    def __init__(self, window):
+    def __init__(self, window, max_workers=None, metrics=False, app=None, process_workers=None):
         super().__init__()
         self.window = window
+        self.app = app
+        self.metrics = BridgeMetrics(metrics)
+        self.max_workers = max_workers
+        self.executor = None
+        self.process_workers = process_workers
+        self.processes = None
+        # 属于 Application 的窗口共用线程池和asyncio事件循环
+        self.async_loop = app.async_loop if app is not None else AsyncioLoop()
+        self.invoker = MainThreadInvoker()
+        self.streams = {}
+        self.scheduler = CallScheduler(self)
+        self.flights = SingleFlight(self)
+        # callbackId -> (调用, 原始的 reply)，只包含在GUI线程之外执行的调用
+        self.pending = {}
+        self.cancellations = {"abort": 0, "timeout": 0, "reload": 0}
+        self.log_buffer = LogBuffer(self)
+        self.events = EventBus(self)
+        self.state = StateStore(self)
         self.callPythonRequested.connect(self.handleCall)
+        self.callPythonBatchRequested.connect(self.handleBatch)
+        self.streamCreditRequested.connect(self.handleStreamCredit)
+        self.streamCancelRequested.connect(self.handleStreamCancel)
+        self.pageReady.connect(self.handlePageReady)
+        self.pageActivated.connect(self.handlePageActivated)
+        self.subscriptionRequested.connect(self.handleSubscription)
+        self.statePatchRequested.connect(self.handleStatePatch)
+        self.stateSyncRequested.connect(self.state.send_snapshot)
+        self.callCancelRequested.connect(self.handleCancel)
         self.pythonMessage.connect(self.logToJS)
 
-    @pyqtSlot(str, list, str)
-    def handleCall(self, funcName, args, callbackId):
-        try:
-            # 检查是否是窗口控制方法
-            if hasattr(self.window, funcName) and callable(getattr(self.window, funcName)):
-                func = getattr(self.window, funcName)
-                result = func(*args) if args else func()
-                self.callbackToJS.emit(callbackId, True, json.dumps(result))
-                return
-            
-            # 检查是否是注册的API函数
-            if funcName in self.window.exposed_functions:
-                func = self.window.exposed_functions[funcName]
-                result = func(*args) if args else func()
-                self.callbackToJS.emit(callbackId, True, json.dumps(result))
-                return
-            
-            raise Exception(f"Function '{funcName}' not found")
-        except Exception as e:
-            logger.error(f"Error calling {funcName}: {str(e)}")
-            self.callbackToJS.emit(callbackId, False, json.dumps({"error": str(e)}))
+    @pyqtSlot(str, list, str)
+    def handleCall(self, funcName, args, callbackId):
+        self.scheduler.submit(BridgeCall(funcName, args, callbackId, self.callbackToJS.emit))
+
+    @pyqtSlot(str)
+    def handleBatch(self, envelope):
+        """执行JavaScript在同一轮事件中合并发送的多个调用
+
+        信封是 [[funcName, args, callbackId], ...] 形式的JSON，
+        每个调用独立执行、独立报错；处理期间完成的结果合并为一次 batchCallbackToJS 返回，
+        其余结果完成后各自通过 callbackToJS 返回
+        """
+        try:
+            calls = json.loads(envelope)
+        except ValueError as e:
+            logger.error(f"Invalid batch envelope: {str(e)}")
+            return
+        
+        batch = BatchReply(self.batchCallbackToJS, self.callbackToJS.emit)
+        for item in calls:
+            try:
+                funcName, args, callbackId = item
+            except (TypeError, ValueError):
+                logger.error(f"Invalid batch entry: {item!r}")
+                continue
+            self.scheduler.submit(BridgeCall(funcName, args or [], callbackId, batch.reply))
+        batch.flush()
+
+    def dispatch(self, call, entry=None):
+        """执行一次调用，并通过 call.reply 返回结果
+
+        entry 为调度器已经查到的调度表项
+        """
+        timed = self.metrics.enabled
+        token = CURRENT_WINDOW.set(self.window)
+        try:
+            if entry is None:
+                entry = self.resolve(call.funcName)
+            # 找到函数之后才开始统计，未注册的名字不会产生新的统计项
+            if timed:
+                self.metrics.track(call)
+            func, mode = entry.func, entry.mode
+            args = entry.convert(self.decode_args(call.args))
+            key = entry.cache.make_key(args) if entry.cache is not None else None
+            if key is not None:
+                payload = entry.cache.get(key)
+                if payload is not None:
+                    call.started = call.received
+                    call.reply(call.callbackId, True, payload)
+                    return
+                call.reply = entry.cache.storing_reply(key, call.reply)
+            if entry.streaming:
+                self.open_stream(call, func(*args), mode)
+                return
+            if mode == "async":
+                self.track_pending(call)
+                self.submit_coroutine(call, func(*args))
+                return
+            if mode == "thread":
+                self.track_pending(call)
+                self.submit_to_pool(call, func, args)
+                return
+            if mode == "process":
+                self.track_pending(call)
+                self.submit_to_process(call, entry, args)
+                return
+            
+            if timed:
+                call.started = time.perf_counter()
+            result = func(*args) if args else func()
+            if inspect.isawaitable(result):
+                self.track_pending(call)
+                self.submit_coroutine(call, result)
+                return
+            if isinstance(result, Future):
+                # 窗口方法把耗时部分交给了工作线程，完成后再返回结果
+                self.track_pending(call)
+                call.future = result
+                result.add_done_callback(
+                    lambda f: self.invoker.invoke.emit(lambda: self.finish_future(call, f, encoded=False)))
+                return
+            call.reply(call.callbackId, True, self.encode(result))
+        except Exception as e:
+            self.reject(call, e)
+        finally:
+            CURRENT_WINDOW.reset(token)
+
+    @pyqtSlot()
+    def handlePageReady(self):
+        """页面中的 hyyhtml 对象初始化完成"""
+        if "page_ready" not in self.window.startup.phases:
+            self.window.startup.mark("page_ready")
+        # 新页面随后会重新发送它的订阅
+        self.events.reset()
+        # 旧页面中等待结果的Promise已经不存在
+        self.sweep_pending()
+
+    @pyqtSlot()
+    def handlePageActivated(self):
+        """页面池中的页面换进了窗口
+
+        换出的页面已自行取消了它的调用和流，这里不清理仍在进行的调用
+        """
+        # 换进的页面随后会重新发送它的订阅
+        self.events.reset()
+
+    @pyqtSlot(str, str)
+    def handleCancel(self, callbackId, reason):
+        """JavaScript端的调用超时或被 AbortSignal 取消"""
+        self.cancel_call(callbackId, reason if reason in self.cancellations else "abort")
+
+    def track_pending(self, call):
+        """登记在GUI线程之外执行的调用，使其可以被取消，结果只会发送一次"""
+        call.token = CancelToken()
+        reply = call.reply
+        self.pending[call.callbackId] = (call, reply)
+
+        def settle(callbackId, success, result):
+            if self.pending.pop(callbackId, None) is not None:
+                reply(callbackId, success, result)
+
+        call.reply = settle
+
+    def cancel_call(self, callbackId, reason="abort"):
+        """取消等待中的调用：尚未开始的任务被丢弃，正在执行的函数收到取消标记"""
+        item = self.pending.pop(callbackId, None)
+        if item is None:
+            call = self.scheduler.discard(callbackId)
+            if call is None:
+                return False
+            # 还在优先级通道中，没有开始执行
+            reply = call.reply
+            call.token = CancelToken()
+        else:
+            call, reply = item
+            call.token.cancel(reason)
+            if call.future is not None:
+                call.future.cancel()
+        self.reply_cancelled(call, reply, reason)
+        return True
+
+    def reply_cancelled(self, call, reply, reason):
+        """标记调用已取消并回复JavaScript"""
+        call.token.cancel(reason)
+        self.cancellations[reason] += 1
+        logger.debug(f"Cancelled call to {call.funcName} ({reason})")
+        # JavaScript端已经放弃的调用也要回复，单飞合并等包装据此得知调用被取消
+        reply(call.callbackId, False, json.dumps({"error": f"Call cancelled ({reason})", "cancelled": reason}))
+
+    def sweep_pending(self):
+        """页面重新加载后取消旧页面的所有调用和流"""
+        for call in self.scheduler.clear():
+            call.token = CancelToken()
+            self.reply_cancelled(call, call.reply, "reload")
+        for callbackId in list(self.pending):
+            self.cancel_call(callbackId, "reload")
+        for stream in list(self.streams.values()):
+            stream.cancel()
+        self.streams.clear()
+
+    @pyqtSlot(str, bool)
+    def handleSubscription(self, topic, subscribed):
+        """JavaScript开始或停止监听某个主题"""
+        self.events.subscribe(topic, subscribed)
+
+    @pyqtSlot(str)
+    def handleStatePatch(self, message):
+        """JavaScript修改了共享状态"""
+        try:
+            self.state.receive(json.loads(message))
+        except (ValueError, KeyError) as e:
+            logger.error(f"Invalid state message: {e}")
+            self.state.send_snapshot()
+
+    @pyqtSlot(str, int)
+    def handleStreamCredit(self, streamId, credits):
+        """JavaScript为流授予额度"""
+        stream = self.streams.get(streamId)
+        if stream is not None:
+            stream.grant(credits)
+
+    @pyqtSlot(str)
+    def handleStreamCancel(self, streamId):
+        """JavaScript提前结束了对流的消费"""
+        stream = self.streams.pop(streamId, None)
+        if stream is not None:
+            stream.cancel()
+
+    def open_stream(self, call, iterator, mode):
+        """为生成器创建流，调用本身立即返回流的标识"""
+        stream = BridgeStream(self, call.callbackId, call.funcName, iterator, mode)
+        self.streams[stream.streamId] = stream
+        call.reply(call.callbackId, True, json.dumps({"__stream__": stream.streamId}))
+
+    def resolve(self, funcName):
+        """在调度表中查找要调用的函数，未注册的名字直接报错"""
+        entry = self.window.dispatch_table.get(funcName)
+        if entry is None:
+            raise Exception(f"Function '{funcName}' not found")
+        return entry
+
+    def thread_pool(self):
+        """获取(必要时创建)API函数使用的线程池"""
+        if self.app is not None:
+            return self.app.thread_pool()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                               thread_name_prefix="hyyhtml-api")
+        return self.executor
+
+    def submit_to_pool(self, call, func, args):
+        """在线程池中执行API函数，结果回到GUI线程后再发送给JavaScript"""
+        timed = call.received is not None
+        
+        window = self.window
+        
+        def run():
+            if timed:
+                call.started = time.perf_counter()
+            # 工作线程会被后续任务复用，结束时恢复上下文
+            window_token = CURRENT_WINDOW.set(window)
+            cancel_token = CURRENT_CANCEL.set(call.token)
+            try:
+                result = func(*args) if args else func()
+                # 序列化也放在工作线程中完成
+                return self.encode(result)
+            finally:
+                CURRENT_CANCEL.reset(cancel_token)
+                CURRENT_WINDOW.reset(window_token)
+        
+        future = call.future = self.thread_pool().submit(run)
+        future.add_done_callback(
+            lambda f: self.invoker.invoke.emit(lambda: self.finish_future(call, f)))
+
+    def process_pool(self):
+        """获取(必要时创建) executor="process" 的API函数使用的进程池"""
+        if self.app is not None:
+            return self.app.process_pool()
+        if self.processes is None:
+            self.processes = ProcessPool(self.invoker, self.process_workers)
+        return self.processes
+
+    def submit_to_process(self, call, entry, args):
+        """在进程池中执行API函数，工作进程崩溃时只有这次调用失败"""
+        timed = call.received is not None
+
+        def started(future):
+            call.future = future
+            if timed:
+                call.started = time.perf_counter()
+
+        def done(future):
+            if call.token.cancelled:
+                return
+            try:
+                result = unpack_buffer(future.result())
+            except BrokenProcessPool:
+                self.reject(call, RuntimeError(f"Worker process died while running '{entry.name}'"))
+                return
+            except Exception as e:
+                self.reject(call, e)
+                return
+            try:
+                call.reply(call.callbackId, True, self.encode(result))
+            except Exception as e:
+                self.reject(call, e)
+
+        self.process_pool().submit(entry, args, done, started)
+
+    def submit_coroutine(self, call, awaitable):
+        """在asyncio事件循环中等待协程，结果回到GUI线程后再发送给JavaScript"""
+        async def run():
+            if call.received is not None and call.started is None:
+                call.started = time.perf_counter()
+            # 每个任务运行在复制的上下文中，这里的设置不会影响其他任务
+            CURRENT_WINDOW.set(self.window)
+            CURRENT_CANCEL.set(call.token)
+            return self.encode(await awaitable)
+        
+        # 取消 future 会取消事件循环中的任务
+        future = call.future = self.async_loop.submit(run())
+        future.add_done_callback(
+            lambda f: self.invoker.invoke.emit(lambda: self.finish_future(call, f)))
+
+    def encode(self, result):
+        """把结果序列化为JSON
+
+        bytes、bytearray、memoryview 和NumPy数组(可以嵌套在列表和字典中)不经过JSON，
+        而是放入 hyyhtml://blob/，结果中以 {"__binary__": id, "url", "dtype", "shape"} 代替，
+        JavaScript读取后得到对应的类型化数组。可以在任意线程中调用。
+        """
+        return json.dumps(result, default=self.encode_binary)
+
+    def encode_binary(self, obj):
+        binary = binary_view(obj)
+        if binary is None:
+            raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+        if self.window.scheme_handler is None:
+            raise RuntimeError("Binary results need the web view to be created")
+        view, dtype, shape = binary
+        blob_id = self.window.scheme_handler.blobs.add(view, "application/octet-stream")
+        return {"__binary__": blob_id, "url": f"hyyhtml://blob/{blob_id}?once",
+                "dtype": dtype, "shape": shape, "size": view.nbytes}
+
+    def decode_args(self, args):
+        """把JavaScript上传的 ArrayBuffer / 类型化数组参数转换为 memoryview"""
+        if not any(isinstance(arg, dict) and "__binary__" in arg for arg in args):
+            return args
+        blobs = self.window.scheme_handler.blobs
+        return [decode_binary(arg, blobs) if isinstance(arg, dict) and "__binary__" in arg else arg
+                for arg in args]
+
+    def finish_future(self, call, future, encoded=True):
+        """在GUI线程中把线程池或事件循环的执行结果发送给JavaScript
+
+        encoded 为 False 时结果尚未序列化为JSON
+        """
+        if call.token is not None and call.token.cancelled:
+            # 已经回复过取消
+            return
+        try:
+            result = future.result()
+            call.reply(call.callbackId, True, result if encoded else self.encode(result))
+        except Exception as e:
+            self.reject(call, e)
+
+    def reject(self, call, error):
+        """通知JavaScript调用失败"""
+        logger.error(f"Error calling {call.funcName}: {str(error)}")
+        call.reply(call.callbackId, False, json.dumps({"error": str(error)}))
+
+    def stats(self):
+        """桥接诊断信息"""
+        stats = self.metrics.snapshot()
+        stats["events"] = self.events.stats()
+        stats["state"] = self.state.stats()
+        stats["pending_calls"] = dict(self.cancellations, pending=len(self.pending))
+        stats["lanes"] = self.scheduler.stats()
+        stats["single_flight"] = self.flights.stats()
+        pool = self.app.processes if self.app is not None else self.processes
+        if pool is not None:
+            stats["process_pool"] = pool.stats()
+        return stats
+
+    def shutdown(self):
+        """关闭线程池和asyncio事件循环，丢弃尚未开始的任务"""
+        for stream in list(self.streams.values()):
+            stream.cancel()
+        self.streams.clear()
+        if self.app is not None:
+            # 共用的线程池和事件循环由 Application.shutdown 关闭
+            return
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.processes is not None:
+            self.processes.shutdown()
+            self.processes = None
+        self.async_loop.stop()
+    
+    @pyqtSlot(str)
+    def logToJS(self, message):
+        """发送日志消息到JavaScript"""
+        self.log_buffer.add("info", message)
+
+
+# 注入页面的桥接脚本，内置页面直接内联，应用包页面通过 hyyhtml://runtime/hyyhtml.js 引入
+BRIDGE_JS = """
+// 全局hyyhtml对象
+window.hyyhtml = {
+    ready: false,
+    // 页面正在窗口中显示并接管了窗口的事件订阅和共享状态
+    active: false,
+    _callbacks: {},
+    _pendingCalls: [],
+    _streams: {},
+    _cache: new Map(),
+    // 主题 -> 监听函数数组
+    _listeners: {},
+    // 控制台中最多保留的日志条数
+    maxLogEntries: 500,
+    // 每个流最多允许缓冲的数据块数(已授予但未消费的额度)
+    streamWindow: 16,
+    // callPython 的默认超时(毫秒)，0 表示不超时
+    callTimeout: 0,
+    // 超时和被取消的调用数
+    callStats: { timedOut: 0, cancelled: 0 }
+};
+
+// 初始化函数
+function initHyyHTML(swapped = false) {
+    // 页面池中的页面在换进窗口之前没有连接桥接，换进时由 Window.swap_page 再次调用
+    if (typeof qt === "undefined" || !qt.webChannelTransport) {
+        window.__hyyhtmlInit = initHyyHTML;
+        return;
+    }
+    new QWebChannel(qt.webChannelTransport, function(channel) {
+        const bridge = channel.objects.bridge;
+        
+        // 处理回调
+        bridge.callbackToJS.connect(function(callbackId, success, result) {
+            let parsedResult;
+            try {
+                parsedResult = JSON.parse(result);
+            } catch (e) {
+                rejectCallback(callbackId, "Error parsing result: " + e);
+                return;
+            }
+            settleCallback(callbackId, success, parsedResult, result.includes('"__binary__"'));
+        });
+        
+        // 处理批量回调: [[callbackId, success, result], ...]
+        bridge.batchCallbackToJS.connect(function(results) {
+            let parsedResults;
+            try {
+                parsedResults = JSON.parse(results);
+            } catch (e) {
+                console.error("Error parsing batch result: " + e);
+                return;
+            }
+            const binary = results.includes('"__binary__"');
+            parsedResults.forEach(([callbackId, success, result]) => {
+                settleCallback(callbackId, success, result, binary);
+            });
+        });
+        
+        // 处理流数据: kind 为 data / end / error
+        bridge.streamToJS.connect(function(streamId, kind, data) {
+            const stream = window.hyyhtml._streams[streamId];
+            if (stream) {
+                stream.receive(kind, JSON.parse(data), data.includes('"__binary__"'));
+            }
+        });
+        
+        // 处理Python合并发送的日志: [[时间戳, 级别, 消息], ...]
+        bridge.logBatchToJS.connect(function(entries) {
+            appendLogEntries(JSON.parse(entries));
+        });
+        
+        // Python端缓存失效时丢弃JavaScript端缓存的结果，args 为空表示全部
+        bridge.cacheInvalidated.connect(function(funcName, args) {
+            const prefix = funcName + ":";
+            const key = args ? prefix + JSON.stringify(JSON.parse(args)) : null;
+            for (const cached of Array.from(window.hyyhtml._cache.keys())) {
+                if (key === null ? cached.startsWith(prefix) : cached === key) {
+                    window.hyyhtml._cache.delete(cached);
+                }
+            }
+        });
+        
+        // 处理共享状态的增量、确认和快照
+        bridge.stateToJS.connect(function(message) {
+            window.hyyhtml.state._receive(JSON.parse(message));
+        });
+        
+        // 处理Python发送的主题事件: [[主题, 数据], ...]
+        bridge.eventsToJS.connect(function(events) {
+            JSON.parse(events).forEach(([topic, payload]) => deliverEvent(topic, payload));
+        });
+        
+        window.hyyhtml._bridge = bridge;
+        
+        // 释放 hyyhtml://blob/<id> 数据
+        window.hyyhtml.releaseBlob = function(blobId) {
+            return window.hyyhtml.callPython('release_blob', blobId);
+        };
+        
+        // 把同一轮微任务中的调用合并成一个信封发送
+        const flushCalls = function() {
+            const calls = window.hyyhtml._pendingCalls;
+            window.hyyhtml._pendingCalls = [];
+            if (calls.length === 0) {
+                return;
+            }
+            try {
+                if (calls.length === 1) {
+                    bridge.callPythonRequested(...calls[0]);
+                } else {
+                    bridge.callPythonBatchRequested(JSON.stringify(calls));
+                }
+            } catch (e) {
+                calls.forEach(call => rejectCallback(call[2], `Error calling Python: ${e}`));
+            }
+        };
+        
+        // options: { timeout: 毫秒, signal: AbortSignal }
+        const registerCall = function(funcName, args, options = {}) {
+            const callbackId = generateUUID();
+            const timeout = options.timeout === undefined ? window.hyyhtml.callTimeout : options.timeout;
+            const signal = options.signal;
+            const promise = new Promise((resolve, reject) => {
+                const callback = { resolve, reject };
+                if (timeout > 0) {
+                    const timer = setTimeout(() => abandonCall(callbackId, "timeout",
+                        `Call to ${funcName} timed out after ${timeout} ms`), timeout);
+                    callback.cleanup = () => clearTimeout(timer);
+                }
+                if (signal) {
+                    const onAbort = () => abandonCall(callbackId, "abort", `Call to ${funcName} was aborted`);
+                    signal.addEventListener("abort", onAbort, { once: true });
+                    const previous = callback.cleanup;
+                    callback.cleanup = () => {
+                        signal.removeEventListener("abort", onAbort);
+                        if (previous) {
+                            previous();
+                        }
+                    };
+                }
+                window.hyyhtml._callbacks[callbackId] = callback;
+            });
+            if (signal && signal.aborted) {
+                // 还没有加入发送队列，不需要通知Python
+                window.hyyhtml.callStats.cancelled++;
+                rejectCallback(callbackId, new DOMException(`Call to ${funcName} was aborted`, "AbortError"));
+            }
+            return { call: [funcName, args, callbackId], promise };
+        };
+        
+        // 创建调用Python函数的统一方法
+        // ArrayBuffer 和类型化数组参数先上传，Python端收到带类型和形状的 memoryview
+        window.hyyhtml.callPython = function(funcName, ...args) {
+            return window.hyyhtml.callPythonWith({}, funcName, ...args);
+        };
+        
+        // 带选项的调用: callPythonWith({ timeout: 5000, signal: controller.signal }, "name", ...args)
+        // 超时或取消时Promise以 TimeoutError / AbortError 拒绝，Python端丢弃尚未开始的任务，
+        // 正在执行的函数可通过 cancel_token() 得知调用已被取消
+        window.hyyhtml.callPythonWith = function(options, funcName, ...args) {
+            if (args.some(isBinary)) {
+                return Promise.all(args.map(encodeBinaryArg))
+                    .then(encoded => window.hyyhtml.callPythonWith(options, funcName, ...encoded));
+            }
+            const { call, promise } = registerCall(funcName, args, options);
+            if (!(call[2] in window.hyyhtml._callbacks)) {
+                // 在发送前已被取消
+                return promise;
+            }
+            window.hyyhtml._pendingCalls.push(call);
+            if (window.hyyhtml._pendingCalls.length === 1) {
+                queueMicrotask(flushCalls);
+            }
+            return promise;
+        };
+        
+        // 相同参数的调用共享一个结果，直到Python端调用 invalidate
+        window.hyyhtml.callPythonCached = function(funcName, ...args) {
+            const key = funcName + ":" + JSON.stringify(args);
+            let promise = window.hyyhtml._cache.get(key);
+            if (!promise) {
+                promise = window.hyyhtml.callPython(funcName, ...args);
+                window.hyyhtml._cache.set(key, promise);
+                // 失败的结果不缓存
+                promise.catch(() => {
+                    if (window.hyyhtml._cache.get(key) === promise) {
+                        window.hyyhtml._cache.delete(key);
+                    }
+                });
+            }
+            return promise;
+        };
+        
+        // 立即把多个调用作为一个信封发送，返回每个调用各自的Promise
+        // 用法: callPythonBatch([["get_size"], ["set_title", "Hi"]])，options 同 callPythonWith
+        window.hyyhtml.callPythonBatch = function(calls, options = {}) {
+            const registered = calls.map(([funcName, ...args]) => registerCall(funcName, args, options));
+            // 已被取消的调用不发送
+            const live = registered.filter(r => r.call[2] in window.hyyhtml._callbacks);
+            if (live.length === 0) {
+                return registered.map(r => r.promise);
+            }
+            try {
+                bridge.callPythonBatchRequested(JSON.stringify(live.map(r => r.call)));
+            } catch (e) {
+                live.forEach(r => rejectCallback(r.call[2], `Error calling Python: ${e}`));
+            }
+            return registered.map(r => r.promise);
+        };
+        
+        // 标记为就绪
+        window.hyyhtml.ready = true;
+        
+        // 通知Python页面已就绪，发送订阅并同步共享状态；页面池中的页面每次换进窗口时重新激活
+        // swapped 为 true 时Python端不清理进行中的调用
+        window.hyyhtml._activate = function(swapped = false) {
+            window.hyyhtml.active = true;
+            if (swapped) {
+                bridge.pageActivated();
+            } else {
+                bridge.pageReady();
+            }
+            Object.keys(window.hyyhtml._listeners).forEach(topic => bridge.subscriptionRequested(topic, true));
+            window.hyyhtml.state._requestSync();
+        };
+        // 换出窗口的页面收不到结果，取消等待中的调用和流
+        window.hyyhtml._deactivate = function() {
+            window.hyyhtml.active = false;
+            Object.keys(window.hyyhtml._callbacks).forEach(callbackId => abandonCall(callbackId, "abort", "Page deactivated"));
+            Object.keys(window.hyyhtml._streams).forEach(streamId => {
+                bridge.streamCancelRequested(streamId);
+                window.hyyhtml._streams[streamId].receive("error", { error: "Page deactivated" });
+            });
+        };
+        
+        // 页面池在后台预取的页面等到换进窗口后再激活
+        if (swapped) {
+            window.hyyhtml._activate(true);
+        } else if (!window.__hyyhtmlPrefetch || document.visibilityState === "visible") {
+            window.hyyhtml._activate();
+        }
+        
+        logToConsole("HyyHTML bridge initialized successfully!", "success");
+        
+        // 初始化UI事件
+        initUIEvents();
+    });
+}
+
+// 监听Python通过 window.emit 发送的主题事件，返回取消监听的函数
+window.hyyhtml.on = function(topic, listener) {
+    const listeners = window.hyyhtml._listeners;
+    if (!listeners[topic]) {
+        listeners[topic] = [];
+        // 只有第一个监听函数需要通知Python
+        if (window.hyyhtml.active) {
+            window.hyyhtml._bridge.subscriptionRequested(topic, true);
+        }
+    }
+    listeners[topic].push(listener);
+    return () => window.hyyhtml.off(topic, listener);
+};
+
+window.hyyhtml.off = function(topic, listener) {
+    const listeners = window.hyyhtml._listeners[topic];
+    if (!listeners) {
+        return;
+    }
+    const index = listeners.indexOf(listener);
+    if (index >= 0) {
+        listeners.splice(index, 1);
+    }
+    if (!listeners.length) {
+        delete window.hyyhtml._listeners[topic];
+        if (window.hyyhtml.active) {
+            window.hyyhtml._bridge.subscriptionRequested(topic, false);
+        }
+    }
+};
+
+// 与Python同步的共享状态，修改以增量发送，见Python端 StateStore
+// 路径为JSON指针，例如 hyyhtml.state.set("/filters/year", 2024)
+window.hyyhtml.state = {
+    data: {},
+    version: 0,
+    synced: false,
+    _syncing: false,
+    // 尚未发送的本地修改(已序列化)
+    _queued: [],
+    _subscribers: [],
+    _nextId: 1,
+    
+    get(path = "") {
+        try {
+            return stateLookup(this.data, path);
+        } catch (e) {
+            return undefined;
+        }
+    },
+    
+    // 只有与旧值不同的部分会发送给Python，返回生成的操作
+    set(path, value) {
+        value = JSON.parse(JSON.stringify(value));
+        let ops;
+        try {
+            ops = stateDiff(stateLookup(this.data, path), value, path, []);
+        } catch (e) {
+            ops = [{ op: "add", path, value }];
+        }
+        this._commit(ops);
+        return ops;
+    },
+    
+    remove(path) {
+        if (this.get(path) !== undefined) {
+            this._commit([{ op: "remove", path }]);
+        }
+    },
+    
+    // listener(ops, source)，source 为 local / python / sync / conflict
+    subscribe(listener) {
+        this._subscribers.push(listener);
+        return () => {
+            const index = this._subscribers.indexOf(listener);
+            if (index >= 0) {
+                this._subscribers.splice(index, 1);
+            }
+        };
+    },
+    
+    _commit(ops) {
+        if (!ops.length) {
+            return;
+        }
+        ops.forEach(op => {
+            this.data = stateApply(this.data, JSON.parse(JSON.stringify(op)));
+            this._queued.push(JSON.stringify(op));
+        });
+        if (this._queued.length === ops.length && this.synced) {
+            queueMicrotask(() => this._flush());
+        }
+        this._notify(ops, "local");
+    },
+    
+    _flush() {
+        if (!this._queued.length || !this.synced || this._syncing) {
+            return;
+        }
+        const ops = "[" + this._queued.join(",") + "]";
+        this._queued = [];
+        window.hyyhtml._bridge.statePatchRequested(
+            `{"id":${this._nextId++},"base":${this.version},"ops":${ops}}`);
+    },
+    
+    _requestSync() {
+        if (!this._syncing) {
+            this._syncing = true;
+            window.hyyhtml._bridge.stateSyncRequested();
+        }
+    },
+    
+    _receive(message) {
+        if (message.kind === "snapshot") {
+            const rejected = message.rejected !== undefined;
+            const initial = !this.synced;
+            this.data = message.data;
+            this.version = message.version;
+            this.synced = true;
+            this._syncing = false;
+            if (initial && !rejected) {
+                // 同步之前的本地修改在快照上重新应用后发送
+                this._queued.forEach(op => {
+                    this.data = stateApply(this.data, JSON.parse(op));
+                });
+                this._flush();
+            } else {
+                // 冲突时丢弃尚未确认的本地修改
+                this._queued = [];
+            }
+            this._notify([{ op: "replace", path: "", value: this.data }], rejected ? "conflict" : "sync");
+            return;
+        }
+        if (this._syncing || !this.synced) {
+            return;
+        }
+        if (message.base !== this.version) {
+            // 漏掉了某个版本，重新同步
+            this._requestSync();
+            return;
+        }
+        this.version = message.version;
+        if (message.kind === "patch") {
+            message.ops.forEach(op => {
+                this.data = stateApply(this.data, op);
+            });
+            this._notify(message.ops, "python");
+        }
+    },
+    
+    _notify(ops, source) {
+        this._subscribers.slice().forEach(listener => {
+            try {
+                listener(ops, source);
+            } catch (e) {
+                console.error(`Error in state listener: ${e}`);
+            }
+        });
+    }
+};
+
+function statePath(path) {
+    if (path === "") {
+        return [];
+    }
+    if (path[0] !== "/") {
+        throw new Error(`Invalid state path: ${path}`);
+    }
+    return path.slice(1).split("/").map(part => part.replace(/~1/g, "/").replace(/~0/g, "~"));
+}
+
+function stateKey(key) {
+    return "/" + String(key).split("~").join("~0").split("/").join("~1");
+}
+
+function stateLookup(document, path) {
+    let value = document;
+    for (const part of statePath(path)) {
+        if (value === null || typeof value !== "object" || !(part in value)) {
+            throw new Error(`Missing state path: ${path}`);
+        }
+        value = value[part];
+    }
+    return value;
+}
+
+// 与Python端 apply_patch_op 相同
+function stateApply(document, op) {
+    const parts = statePath(op.path);
+    if (!parts.length) {
+        return op.op === "remove" ? {} : op.value;
+    }
+    // 与Python端相同，缺少的中间层创建为空对象
+    let parent = document;
+    for (const part of parts.slice(0, -1)) {
+        if (!Array.isArray(parent) && !(part in parent)) {
+            if (op.op === "remove") {
+                return document;
+            }
+            parent[part] = {};
+        }
+        parent = parent[part];
+        if (parent === null || typeof parent !== "object") {
+            throw new Error(`Cannot ${op.op} ${op.path}: ${part} is not an object or array`);
+        }
+    }
+    const key = parts[parts.length - 1];
+    if (Array.isArray(parent)) {
+        const index = key === "-" ? parent.length : Number(key);
+        if (op.op === "remove") {
+            parent.splice(index, 1);
+        } else if (op.op === "add" || index === parent.length) {
+            parent.splice(index, 0, op.value);
+        } else {
+            parent[index] = op.value;
+        }
+    } else if (op.op === "remove") {
+        delete parent[key];
+    } else {
+        parent[key] = op.value;
+    }
+    return document;
+}
+
+// 与Python端 diff_values 相同
+function stateDiff(oldValue, newValue, path, ops) {
+    const isObject = value => value !== null && typeof value === "object" && !Array.isArray(value);
+    if (isObject(oldValue) && isObject(newValue)) {
+        Object.keys(oldValue).forEach(key => {
+            if (!(key in newValue)) {
+                ops.push({ op: "remove", path: path + stateKey(key) });
+            }
+        });
+        Object.keys(newValue).forEach(key => {
+            if (key in oldValue) {
+                stateDiff(oldValue[key], newValue[key], path + stateKey(key), ops);
+            } else {
+                ops.push({ op: "add", path: path + stateKey(key), value: newValue[key] });
+            }
+        });
+    } else if (Array.isArray(oldValue) && Array.isArray(newValue)) {
+        const common = Math.min(oldValue.length, newValue.length);
+        for (let index = 0; index < common; index++) {
+            stateDiff(oldValue[index], newValue[index], `${path}/${index}`, ops);
+        }
+        newValue.slice(common).forEach(value => ops.push({ op: "add", path: `${path}/-`, value }));
+        for (let index = oldValue.length - 1; index >= common; index--) {
+            ops.push({ op: "remove", path: `${path}/${index}` });
+        }
+    } else if (typeof oldValue !== typeof newValue || Array.isArray(oldValue) !== Array.isArray(newValue)
+               || oldValue !== newValue) {
+        ops.push({ op: "replace", path, value: newValue });
+    }
+    return ops;
+}
+
+function deliverEvent(topic, payload) {
+    const listeners = window.hyyhtml._listeners[topic];
+    if (!listeners) {
+        return;
+    }
+    // 复制一份，监听函数中可以安全地取消监听
+    listeners.slice().forEach(listener => {
+        try {
+            listener(payload, topic);
+        } catch (e) {
+            console.error(`Error in listener for ${topic}: ${e}`);
+        }
+    });
+}
+
+// 完成一个等待中的调用
+// binary 为 true 时结果中可能有需要从 hyyhtml://blob/ 读取的二进制数据
+function settleCallback(callbackId, success, result, binary = false) {
+    const callback = window.hyyhtml._callbacks[callbackId];
+    if (callback) {
+        if (callback.cleanup) {
+            callback.cleanup();
+        }
+        if (success) {
+            if (result && result.__stream__) {
+                result = createStream(result.__stream__);
+            }
+            callback.resolve(binary ? decodeBinary(result) : result);
+        } else {
+            callback.reject((result && result.error) || "Unknown error");
+        }
+        delete window.hyyhtml._callbacks[callbackId];
+    }
+}
+
+// 类型化数组构造函数，与Python端 BINARY_DTYPES 对应
+const BINARY_ARRAYS = {
+    int8: Int8Array, uint8: Uint8Array, int16: Int16Array, uint16: Uint16Array,
+    int32: Int32Array, uint32: Uint32Array, int64: BigInt64Array, uint64: BigUint64Array,
+    float32: Float32Array, float64: Float64Array
+};
+
+function isBinary(value) {
+    return value instanceof ArrayBuffer || ArrayBuffer.isView(value);
+}
+
+// 把结果中的 {__binary__, url, dtype, shape} 替换为类型化数组，数组带有 dtype 和 shape 属性
+async function decodeBinary(value) {
+    if (value === null || typeof value !== "object") {
+        return value;
+    }
+    if (typeof value.__binary__ === "string" && value.url) {
+        const response = await fetch(value.url);
+        if (!response.ok) {
+            throw new Error(`Binary result ${value.__binary__} is no longer available`);
+        }
+        const Ctor = BINARY_ARRAYS[value.dtype] || Uint8Array;
+        const array = new Ctor(await response.arrayBuffer());
+        array.dtype = value.dtype;
+        array.shape = value.shape;
+        return array;
+    }
+    if (Array.isArray(value)) {
+        return Promise.all(value.map(decodeBinary));
+    }
+    const keys = Object.keys(value);
+    const decoded = await Promise.all(keys.map(key => decodeBinary(value[key])));
+    keys.forEach((key, index) => {
+        value[key] = decoded[index];
+    });
+    return value;
+}
+
+// 把二进制参数POST到 hyyhtml://upload，返回Python端可识别的占位对象
+async function encodeBinaryArg(value) {
+    if (!isBinary(value)) {
+        return value;
+    }
+    const bytes = value instanceof ArrayBuffer
+        ? new Uint8Array(value)
+        : new Uint8Array(value.buffer, value.byteOffset, value.byteLength);
+    const typed = !(value instanceof ArrayBuffer || value instanceof DataView);
+    const dtype = typed ? Object.keys(BINARY_ARRAYS).find(name => value instanceof BINARY_ARRAYS[name]) : "uint8";
+    const marker = { __binary__: null, dtype: dtype || "uint8", shape: value.shape || [typed ? value.length : bytes.length] };
+    try {
+        const response = await fetch("hyyhtml://upload/", { method: "POST", body: bytes });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        marker.__binary__ = await response.text();
+    } catch (e) {
+        // 不支持上传时(Qt 6.7 之前)内联为base64
+        let text = "";
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            text += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        marker.base64 = btoa(text);
+    }
+    return marker;
+}
+
+function rejectCallback(callbackId, reason) {
+    const callback = window.hyyhtml._callbacks[callbackId];
+    if (callback) {
+        if (callback.cleanup) {
+            callback.cleanup();
+        }
+        callback.reject(reason);
+        delete window.hyyhtml._callbacks[callbackId];
+    }
+}
+
+// 放弃等待中的调用，reason 为 timeout 或 abort
+// 尚未发送的调用直接移除，已发送的通知Python取消，之后到达的结果被忽略
+function abandonCall(callbackId, reason, message) {
+    if (!(callbackId in window.hyyhtml._callbacks)) {
+        return;
+    }
+    const queued = window.hyyhtml._pendingCalls.findIndex(call => call[2] === callbackId);
+    if (queued >= 0) {
+        window.hyyhtml._pendingCalls.splice(queued, 1);
+    } else if (window.hyyhtml._bridge) {
+        window.hyyhtml._bridge.callCancelRequested(callbackId, reason);
+    }
+    if (reason === "timeout") {
+        window.hyyhtml.callStats.timedOut++;
+    } else {
+        window.hyyhtml.callStats.cancelled++;
+    }
+    rejectCallback(callbackId, new DOMException(message, reason === "timeout" ? "TimeoutError" : "AbortError"));
+}
+
+// 创建流对象，可用 for await (const chunk of stream) 读取
+function createStream(streamId) {
+    const bridge = window.hyyhtml._bridge;
+    const capacity = window.hyyhtml.streamWindow;
+    const buffer = [];
+    const waiters = [];
+    let outstanding = 0;
+    let finished = false;
+    let failure = null;
+    
+    // 缓冲和未到达的额度低于一半时补足额度
+    const refill = function() {
+        if (finished) {
+            return;
+        }
+        const inFlight = buffer.length + outstanding;
+        if (inFlight <= capacity / 2) {
+            outstanding += capacity - inFlight;
+            bridge.streamCreditRequested(streamId, capacity - inFlight);
+        }
+    };
+    
+    const close = function() {
+        finished = true;
+        delete window.hyyhtml._streams[streamId];
+    };
+    
+    const stream = {
+        receive(kind, data, binary = false) {
+            if (kind === "data") {
+                stream.binary = stream.binary || binary;
+                outstanding -= data.length;
+                buffer.push(...data);
+            } else if (kind === "error") {
+                failure = data.error || "Unknown error";
+                close();
+            } else {
+                close();
+            }
+            while (waiters.length && (buffer.length || finished)) {
+                const waiter = waiters.shift();
+                stream.next().then(waiter.resolve, waiter.reject);
+            }
+        },
+        next() {
+            if (buffer.length) {
+                const value = buffer.shift();
+                refill();
+                if (stream.binary) {
+                    return decodeBinary(value).then(value => ({ value, done: false }));
+                }
+                return Promise.resolve({ value, done: false });
+            }
+            if (failure !== null) {
+                return Promise.reject(failure);
+            }
+            if (finished) {
+                return Promise.resolve({ value: undefined, done: true });
+            }
+            return new Promise((resolve, reject) => waiters.push({ resolve, reject }));
+        },
+        return() {
+            if (!finished) {
+                close();
+                bridge.streamCancelRequested(streamId);
+            }
+            buffer.length = 0;
+            return Promise.resolve({ value: undefined, done: true });
+        },
+        [Symbol.asyncIterator]() {
+            return stream;
+        }
+    };
+    
+    window.hyyhtml._streams[streamId] = stream;
+    refill();
+    return stream;
+}
+
+// 生成UUID
+function generateUUID() {
+    return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, function(c) {
+        const r = Math.random() * 16 | 0;
+        const v = c === 'x' ? r : (r & 0x3 | 0x8);
+        return v.toString(16);
+    });
+}
+
+// 控制台日志函数
+function logToConsole(message, type = "info") {
+    appendLogEntries([[Date.now(), type, message]]);
+}
+
+// 一次性追加多条日志，超过 maxLogEntries 时删除最早的条目
+function appendLogEntries(entries) {
+    const consoleEl = document.getElementById('console');
+    if (consoleEl) {
+        const fragment = document.createDocumentFragment();
+        entries.forEach(([timestamp, type, message]) => {
+            const entry = document.createElement('div');
+            entry.className = `log-entry ${type}`;
+            entry.textContent = `[${new Date(timestamp).toLocaleTimeString()}] ${message}`;
+            fragment.appendChild(entry);
+        });
+        consoleEl.appendChild(fragment);
+        
+        let excess = consoleEl.childElementCount - window.hyyhtml.maxLogEntries;
+        while (excess-- > 0) {
+            consoleEl.firstElementChild.remove();
+        }
+        consoleEl.scrollTop = consoleEl.scrollHeight;
+    }
     
-    @pyqtSlot(str)
-    def logToJS(self, message):
-        """发送日志消息到JavaScript"""
-        self.window.page.runJavaScript(f"logToConsole('{message}', 'info')")
+    // 同时输出到浏览器控制台
+    entries.forEach(([timestamp, type, message]) => {
+        console.log(`[${type.toUpperCase()}] ${message}`);
+    });
+}
+
+// 初始化UI事件
+function initUIEvents() {
+    // 设置按钮事件处理程序
+    const bindButton = (id, funcName, ...args) => {
+        const btn = document.getElementById(id);
+        if (btn) {
+            btn.addEventListener('click', () => {
+                window.hyyhtml.callPython(funcName, ...args)
+                    .then(result => {
+                        logToConsole(`Python ${funcName}() succeeded: ${JSON.stringify(result)}`, "success");
+                    })
+                    .catch(error => {
+                        logToConsole(`Error calling ${funcName}(): ${error}`, "error");
+                    });
+            });
+        }
+    };
+    
+    // 绑定按钮
+    bindButton('btn-hello', 'hello');
+    bindButton('btn-destroy', 'destroy');
+    bindButton('btn-move', 'set_position', Math.floor(Math.random() * 500), Math.floor(Math.random() * 300));
+    bindButton('btn-resize', 'set_size', 800, 600);
+    bindButton('btn-center', 'center');
+    bindButton('btn-minimize', 'minimize');
+    bindButton('btn-maximize', 'maximize');
+    bindButton('btn-restore', 'restore');
+    bindButton('btn-fullscreen', 'fullscreen');
+    bindButton('btn-hide', 'hide_window');
+    bindButton('btn-show', 'show_window');
+    bindButton('btn-opacity', 'set_opacity', 0.7);
+    bindButton('btn-topmost', 'set_topmost', true);
+    bindButton('btn-notify', 'show_message', 'Hello from HyyHTML', 'This is a system notification!');
+    bindButton('btn-capture', 'capture_screen');
+    bindButton('btn-screenshot', 'capture_window');
+    bindButton('btn-clipboard', 'set_clipboard_text', 'Text from HyyHTML app');
+    bindButton('btn-js', 'execute_js', 'document.body.style.backgroundColor = "#2c3e50"');
+    bindButton('btn-reload', 'reload');
+    bindButton('btn-zoom', 'set_zoom', 1.2);
+    
+    // 初始日志
+    logToConsole("HyyHTML application started", "info");
+    logToConsole("Click buttons to interact with Python backend", "info");
+}
+
+// 页面加载完成后初始化，脚本在文档解析完成后才加载时立即初始化
+if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", function() {
+        // 初始化hyyhtml
+        initHyyHTML();
+    });
+} else {
+    initHyyHTML();
+}
+"""
 
 
 class Window(QMainWindow):
     _app_instance = None
+    # Web视图创建完成并开始加载页面
+    webViewReady = pyqtSignal()
     
-    def __init__(self):
+    def __init__(self, dispatch_mode="main", max_workers=None, metrics=False, fast_start=False,
+                 app=None, window_id=None, process_workers=None):
+        """创建窗口
+
+        dispatch_mode 为 "main" 时API函数在GUI线程中同步执行，
+        为 "thread" 时在最多 max_workers 个线程的线程池中执行；
+        metrics 为 True 时记录每个函数的调用统计，见 stats()；
+        fast_start 为 True 时先显示原生占位界面，占位界面第一次绘制之后才导入 QtWebEngineWidgets、
+        创建Web视图并加载页面，此前的 load_url 等网页操作推迟到视图创建之后执行，
+        窗口未显示时不会创建视图；QtWebEngineCore 在导入本模块时就已加载，不在推迟之列；
+        各启动阶段的耗时见 startup_timings()；
+        app 为 Application 时共用其网页配置、API注册表、线程池和事件循环，
+        一般通过 app.create_window() 创建，window_id 用于在多个窗口中定位该窗口；
+        process_workers 为 executor="process" 的API函数使用的进程数，默认为CPU核数
+        """
+        if dispatch_mode not in DISPATCH_MODES:
+            raise ValueError(f"Unknown dispatch mode: {dispatch_mode}")
+        
+        phases = StartupPhases()
         # 确保QApplication实例存在
-        if Window._app_instance is None:
-            Window._app_instance = QApplication(sys.argv)
+        if Window.ensure_application():
+            phases.mark("qapplication")
         super().__init__()
         
-        self.browser = QWebEngineView()
-        self.setCentralWidget(self.browser)
+        self.startup = phases
+        self.fast_start = fast_start
+        self.dispatch_mode = dispatch_mode
+        self.app = app
+        self.window_id = window_id or uuid.uuid4().hex[:8]
         
-        self.channel = QWebChannel()
-        self.bridge = JSBridge(self)
+        # Web视图由 create_webview 创建
+        self.browser = None
+        self.page = None
+        self.scheme_handler = None
+        self.pending_url = None
+        self.pending_webview_calls = []
+        # 快速启动时的占位界面，见 eventFilter
+        self.placeholder = None
+        # 见 enable_page_pool
+        self.page_pool = None
         
-        self.page = self.browser.page()
-        self.page.setWebChannel(self.channel)
+        self.channel = QWebChannel()
+        self.bridge = JSBridge(self, max_workers, metrics, app, process_workers)
+        # 与页面中 hyyhtml.state 同步的共享状态
+        self.state = self.bridge.state
         
         self.timers = {}
+        self.scheduler = TimerScheduler(self.timers, self)
+        self.log_level = "info"
         self.exposed_functions = {}
+        self.api_options = {}
+        self.caches = {}
+        self.dispatch_table = MappingProxyType({})
+        if app is not None:
+            # 全局注册的缓存配置，每个窗口各自缓存
+            for name, options in app.cache_options.items():
+                self.caches[name] = ResultCache(**options)
+        self.state_stream = WindowStateStream(self)
         
         # 注册窗口控制方法
         self.register_window_methods()
+        phases.mark("bridge")
+        
+        if fast_start:
+            # 先显示占位界面，第一次绘制后再创建Web引擎，见 eventFilter
+            self.set_defaults(icon=False)
+            self.placeholder = self.create_placeholder()
+            self.placeholder.installEventFilter(self)
+            self.setCentralWidget(self.placeholder)
+            phases.mark("placeholder")
+        else:
+            # 设置默认窗口
+            self.set_defaults()
+            phases.mark("defaults")
+            self.create_webview()
+
+    @staticmethod
+    def ensure_application():
+        """创建共用的QApplication实例，返回是否为新创建"""
+        if Window._app_instance is not None:
+            return False
+        register_url_scheme()
+        # 允许在QApplication创建之后再导入QtWebEngineWidgets
+        QCoreApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
+        Window._app_instance = QApplication(sys.argv)
+        return True
+
+    def create_webview(self):
+        """创建Web引擎视图，连接桥接对象并加载页面"""
+        QWebEngineView = load_webengine()
+        self.startup.mark("import_webengine")
+        
+        self.browser = QWebEngineView()
+        if self.app is not None:
+            self.browser.setPage(QWebEnginePage(self.app.web_profile(), self.browser))
+        self.page = self.browser.page()
+        self.page.setWebChannel(self.channel)
+        self.scheme_handler = install_scheme_handler(self.page.profile())
+        self.setCentralWidget(self.browser)
+        self.startup.mark("webview")
         
-        # 设置默认窗口
-        self.set_defaults()
+        if self.fast_start:
+            self.setWindowIcon(self.create_default_icon())
         
-        # 加载HTML页面
-        self.load_html()
+        # 加载HTML页面，快速启动期间已调用 load_url 时直接加载该地址
+        if self.pending_url is not None:
+            self.browser.load(QUrl(self.pending_url))
+        else:
+            self.load_html()
         
         # 注册桥接对象
         self.channel.registerObject('bridge', self.bridge)
+        self.startup.mark("load_html")
+        
+        pending, self.pending_webview_calls = self.pending_webview_calls, []
+        for callback in pending:
+            callback()
+        self.webViewReady.emit()
+
+    def with_webview(self, callback):
+        """Web视图已创建时立即执行，否则推迟到创建之后"""
+        if self.browser is None:
+            self.pending_webview_calls.append(callback)
+        else:
+            callback()
+
+    def create_placeholder(self):
+        """快速启动时显示的原生占位界面"""
+        placeholder = QLabel("Loading...")
+        placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        placeholder.setStyleSheet("background: #1a2a6c; color: white; font-size: 18px;")
+        return placeholder
+
+    def eventFilter(self, watched, event):
+        """占位界面绘制完成后的下一轮事件循环中创建Web视图"""
+        if watched is self.placeholder and event.type() == QEvent.Type.Paint:
+            watched.removeEventFilter(self)
+            self.placeholder = None
+            self.startup.mark("placeholder_painted")
+            QTimer.singleShot(0, self.create_webview)
+        return super().eventFilter(watched, event)
+
+    def startup_timings(self):
+        """启动各阶段耗时(毫秒)，page_ready 为页面中 hyyhtml 就绪的时间"""
+        timings = self.startup.snapshot()
+        timings["fast_start"] = self.fast_start
+        return timings
 
     def register_window_methods(self):
         """注册所有窗口控制方法"""
@@ -105,6 +3433,9 @@ class Window(QMainWindow):
             'set_min_size': self.set_min_size,
             'set_max_size': self.set_max_size,
             'after': self.after,
+            'every': self.every,
+            'cancel_timer': self.cancel_timer,
+            'list_timers': self.list_timers,
             'get_size': self.get_size,
             'get_position': self.get_position,
             'set_opacity': self.set_opacity,
@@ -130,17 +3461,71 @@ class Window(QMainWindow):
             'set_window_style': self.set_window_style,
             'set_cursor': self.set_cursor,
             'set_mouse_tracking': self.set_mouse_tracking,
-            'capture_screen': self.capture_screen
+            # JavaScript调用时不在GUI线程中等待编码
+            'capture_screen': self.capture_screen_async,
+            'capture_window': self.capture_window_async,
+            'release_blob': self.release_blob,
+            'set_log_level': self.set_log_level,
+            'set_log_interval': self.set_log_interval,
+            'set_event_interval': self.set_event_interval,
+            'set_state_interval': self.set_state_interval,
+            'get_window_snapshot': self.get_window_snapshot,
+            'get_cache_stats': self.get_cache_stats,
+            'get_bridge_stats': self.get_bridge_stats,
+            'set_metrics_enabled': self.set_metrics_enabled,
+            'get_startup_timings': self.get_startup_timings,
+            'get_bundle_stats': self.get_bundle_stats,
+            'prefetch': self.prefetch,
+            'get_page_pool_stats': self.get_page_pool_stats,
+            'get_window_id': self.get_window_id,
+            'list_windows': self.list_windows,
+            'send_to_window': self.send_to_window
         }
+        self.rebuild_dispatch_table()
+
+    def rebuild_dispatch_table(self):
+        """根据窗口方法和 @window.api 注册的函数重新生成只读调度表
+
+        窗口方法同时以注册名和方法名登记，并且总在GUI线程中执行；
+        与窗口方法同名的API函数会被忽略。只有调度表中的名字才能被JavaScript调用。
+        """
+        functions, options = self.api_functions()
+        table = {}
+        for name, func in functions.items():
+            option = options.get(name, {})
+            if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+                mode = "async"
+            else:
+                mode = option.get("executor") or self.dispatch_mode
+            table[name] = DispatchEntry(name, func, mode, self.caches.get(name),
+                                        option.get("max_concurrency"), option.get("priority", "normal"),
+                                        option.get("single_flight", False))
 
-    def set_defaults(self):
+        for name, method in self.window_methods.items():
+            for alias in (name, method.__name__):
+                if alias in functions:
+                    logger.warning(f"API function '{alias}' is shadowed by a window method")
+                # 窗口方法都是轻量的界面操作，走 interactive 通道
+                table[alias] = DispatchEntry(alias, method, "main", self.caches.get(alias), priority="interactive")
+        
+        self.dispatch_table = MappingProxyType(table)
+
+    def api_functions(self):
+        """返回 (函数, 选项)，窗口上注册的函数覆盖 Application 上的同名函数"""
+        if self.app is None:
+            return self.exposed_functions, self.api_options
+        return ({**self.app.exposed_functions, **self.exposed_functions},
+                {**self.app.api_options, **self.api_options})
+
+    def set_defaults(self, icon=True):
         """设置窗口默认值"""
         self.setWindowTitle("HyyHTML Application")
         self.resize(800, 600)
         self.setMinimumSize(400, 300)
         
         # 设置默认图标
-        self.setWindowIcon(self.create_default_icon())
+        if icon:
+            self.setWindowIcon(self.create_default_icon())
         
         # 创建状态栏
         self.statusBar().showMessage("Ready")
@@ -345,6 +3730,14 @@ class Window(QMainWindow):
                     color: #7ec0ff;
                 }
                 
+                .warning {
+                    color: #ffd27e;
+                }
+                
+                .debug {
+                    color: #b0b0b0;
+                }
+                
                 footer {
                     text-align: center;
                     margin-top: 40px;
@@ -375,139 +3768,7 @@ class Window(QMainWindow):
                 }
             </style>
             <script src="qrc:///qtwebchannel/qwebchannel.js"></script>
-            <script>
-                // 全局hyyhtml对象
-                window.hyyhtml = {
-                    ready: false,
-                    _callbacks: {}
-                };
-                
-                // 初始化函数
-                function initHyyHTML() {
-                    new QWebChannel(qt.webChannelTransport, function(channel) {
-                        const bridge = channel.objects.bridge;
-                        
-                        // 处理回调
-                        bridge.callbackToJS.connect(function(callbackId, success, result) {
-                            const callback = window.hyyhtml._callbacks[callbackId];
-                            if (callback) {
-                                try {
-                                    const parsedResult = JSON.parse(result);
-                                    if (success) {
-                                        callback.resolve(parsedResult);
-                                    } else {
-                                        callback.reject(parsedResult.error || "Unknown error");
-                                    }
-                                } catch (e) {
-                                    callback.reject("Error parsing result: " + e);
-                                }
-                                delete window.hyyhtml._callbacks[callbackId];
-                            }
-                        });
-                        
-                        // 创建调用Python函数的统一方法
-                        window.hyyhtml.callPython = function(funcName, ...args) {
-                            return new Promise((resolve, reject) => {
-                                const callbackId = generateUUID();
-                                window.hyyhtml._callbacks[callbackId] = { resolve, reject };
-                                
-                                if (bridge) {
-                                    try {
-                                        bridge.callPythonRequested(funcName, args, callbackId);
-                                    } catch (e) {
-                                        reject(`Error calling Python: ${e}`);
-                                    }
-                                } else {
-                                    reject("Bridge not ready");
-                                }
-                            });
-                        };
-                        
-                        // 标记为就绪
-                        window.hyyhtml.ready = true;
-                        
-                        logToConsole("HyyHTML bridge initialized successfully!", "success");
-                        
-                        // 初始化UI事件
-                        initUIEvents();
-                    });
-                }
-                
-                // 生成UUID
-                function generateUUID() {
-                    return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, function(c) {
-                        const r = Math.random() * 16 | 0;
-                        const v = c === 'x' ? r : (r & 0x3 | 0x8);
-                        return v.toString(16);
-                    });
-                }
-                
-                // 控制台日志函数
-                function logToConsole(message, type = "info") {
-                    const consoleEl = document.getElementById('console');
-                    if (consoleEl) {
-                        const entry = document.createElement('div');
-                        entry.className = `log-entry ${type}`;
-                        entry.textContent = `[${new Date().toLocaleTimeString()}] ${message}`;
-                        consoleEl.appendChild(entry);
-                        consoleEl.scrollTop = consoleEl.scrollHeight;
-                    }
-                    
-                    // 同时输出到浏览器控制台
-                    console.log(`[${type.toUpperCase()}] ${message}`);
-                }
-                
-                // 初始化UI事件
-                function initUIEvents() {
-                    // 设置按钮事件处理程序
-                    const bindButton = (id, funcName, ...args) => {
-                        const btn = document.getElementById(id);
-                        if (btn) {
-                            btn.addEventListener('click', () => {
-                                window.hyyhtml.callPython(funcName, ...args)
-                                    .then(result => {
-                                        logToConsole(`Python ${funcName}() succeeded: ${JSON.stringify(result)}`, "success");
-                                    })
-                                    .catch(error => {
-                                        logToConsole(`Error calling ${funcName}(): ${error}`, "error");
-                                    });
-                            });
-                        }
-                    };
-                    
-                    // 绑定按钮
-                    bindButton('btn-hello', 'hello');
-                    bindButton('btn-destroy', 'destroy');
-                    bindButton('btn-move', 'set_position', Math.floor(Math.random() * 500), Math.floor(Math.random() * 300));
-                    bindButton('btn-resize', 'set_size', 800, 600);
-                    bindButton('btn-center', 'center');
-                    bindButton('btn-minimize', 'minimize');
-                    bindButton('btn-maximize', 'maximize');
-                    bindButton('btn-restore', 'restore');
-                    bindButton('btn-fullscreen', 'fullscreen');
-                    bindButton('btn-hide', 'hide_window');
-                    bindButton('btn-show', 'show_window');
-                    bindButton('btn-opacity', 'set_opacity', 0.7);
-                    bindButton('btn-topmost', 'set_topmost', true);
-                    bindButton('btn-notify', 'show_message', 'Hello from HyyHTML', 'This is a system notification!');
-                    bindButton('btn-capture', 'capture_screen');
-                    bindButton('btn-screenshot', 'capture_window');
-                    bindButton('btn-clipboard', 'set_clipboard_text', 'Text from HyyHTML app');
-                    bindButton('btn-js', 'execute_js', 'document.body.style.backgroundColor = "#2c3e50"');
-                    bindButton('btn-reload', 'reload');
-                    bindButton('btn-zoom', 'set_zoom', 1.2);
-                    
-                    // 初始日志
-                    logToConsole("HyyHTML application started", "info");
-                    logToConsole("Click buttons to interact with Python backend", "info");
-                }
-                
-                // 页面加载完成后初始化
-                document.addEventListener("DOMContentLoaded", function() {
-                    // 初始化hyyhtml
-                    initHyyHTML();
-                });
-            </script>
+            <script>""" + BRIDGE_JS + """</script>
         </head>
         <body>
             <div class="container">
@@ -628,20 +3889,165 @@ class Window(QMainWindow):
         """
         self.browser.setHtml(html_content)
 
-    def api(self, func):
-        """装饰器，用于注册Python函数给JavaScript调用"""
+    def api(self, func=None, *, executor=None, cache=None, max_concurrency=None, priority="normal",
+            single_flight=False):
+        """装饰器，用于注册Python函数给JavaScript调用
+
+        可直接使用 @window.api，也可以带参数使用:
+            executor         "main" / "thread" / "process"，未指定时使用窗口的 dispatch_mode
+            cache            True 或 {"maxsize", "ttl", "key"}，缓存序列化后的结果，见 enable_cache
+            max_concurrency  同时执行的最大调用数，超出的调用排队
+            priority         "interactive" / "normal" / "bulk"，见 CallScheduler；窗口方法总是 interactive
+            single_flight    为 True 时参数相同的并发调用只执行一次，共享同一个结果，见 SingleFlight
+        async def 函数总是在asyncio事件循环中并发执行，该事件循环运行在独立的线程中，
+        与线程池中的函数一样不能直接操作窗口和控件，需要时通过 run_on_main 在GUI线程中执行；
+        log、emit 和 state 可以在任意线程中使用。
+        生成器和异步生成器函数的结果以流的形式返回，JavaScript可用 for await 逐块读取。
+        "process" 适合CPU密集的函数，函数、参数和结果通过pickle传递，
+        函数必须定义在模块顶层，见 ProcessPool。
+        不在GUI线程中执行的函数可以用 cancel_token() 响应JavaScript端的超时和取消。
+        """
+        if func is None:
+            return partial(self.api, executor=executor, cache=cache, max_concurrency=max_concurrency,
+                           priority=priority, single_flight=single_flight)
+
+        self.api_options[func.__name__] = make_api_options(func, executor, max_concurrency, priority,
+                                                           single_flight)
         self.exposed_functions[func.__name__] = func
+        if cache:
+            self.enable_cache(func.__name__, **(cache if isinstance(cache, dict) else {}))
+        else:
+            self.rebuild_dispatch_table()
         logger.info(f"Registered function for JavaScript: {func.__name__}")
         return func
 
-    def log(self, message):
-        """发送日志消息到JavaScript控制台"""
-        self.bridge.pythonMessage.emit(message)
+    def enable_cache(self, name, maxsize=128, ttl=None, key=None):
+        """缓存调度表中某个函数(也可以是窗口方法)的结果
+
+        maxsize 为最多缓存的参数组合数，ttl 为过期秒数(None 表示不过期)，
+        key 为由参数计算缓存键的函数，默认使用参数的规范化JSON，含二进制参数的调用不缓存
+        """
+        func = self.api_functions()[0].get(name) or self.window_methods.get(name)
+        if func is None:
+            raise ValueError(f"Function '{name}' not found")
+        if inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func):
+            raise ValueError(f"Streaming function '{name}' cannot be cached")
+        self.caches[name] = ResultCache(maxsize, ttl, key)
+        self.rebuild_dispatch_table()
+
+    def invalidate(self, name, *args):
+        """删除函数的缓存结果，不传参数时清空该函数的全部缓存
+
+        同时通知JavaScript端 callPythonCached 丢弃对应的结果
+        """
+        cache = self.caches.get(name)
+        if cache is not None:
+            entry = self.dispatch_table.get(name)
+            if args and entry is not None:
+                # 与调用时一样按注解转换参数，生成相同的缓存键
+                args = tuple(entry.convert(list(args)))
+            if not args:
+                cache.invalidate()
+            else:
+                key = cache.make_key(args)
+                if key is not None:
+                    cache.invalidate(key)
+        self.bridge.cacheInvalidated.emit(name, json.dumps(list(args)) if args else "")
+
+    def log(self, message, level="info"):
+        """发送日志消息到JavaScript控制台，低于 log_level 的日志直接丢弃"""
+        if LOG_LEVELS.get(level, 20) < LOG_LEVELS[self.log_level]:
+            return
+        self.bridge.log_buffer.add(level, message)
+
+    def emit(self, topic, payload=None):
+        """向通过 hyyhtml.on(topic, cb) 订阅的JavaScript监听器发送事件
+
+        没有订阅者时不做任何事并返回 False。可以在任意线程中调用。
+        """
+        return self.bridge.events.emit(topic, payload)
+
+    def coalesce(self, topic, enabled=True):
+        """把主题设为合并发送，每个发送间隔内只保留最新的值"""
+        self.bridge.events.coalesce(topic, enabled)
+
+    def has_subscribers(self, topic):
+        """JavaScript是否监听了该主题"""
+        return self.bridge.events.subscribed(topic)
+
+    def run_on_main(self, func, *args):
+        """在GUI线程中执行 func(*args)，返回 concurrent.futures.Future，可以在任意线程中调用
+
+        在GUI线程中调用时立即执行。async def API函数中可以这样等待结果:
+            await asyncio.wrap_future(window.run_on_main(window.set_title, "Done"))
+        """
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        # 跨线程发射时排队到GUI线程
+        self.bridge.invoker.invoke.emit(run)
+        return future
+
+    def window_snapshot(self):
+        """窗口位置、大小和状态的快照"""
+        snapshot = self.get_position()
+        snapshot.update(self.get_size())
+        snapshot.update(self.get_window_state())
+        return snapshot
+
+    def get_window_snapshot(self):
+        """获取窗口位置、大小和状态"""
+        return self.window_snapshot()
+
+    def set_state_interval(self, interval_ms: int):
+        """设置窗口状态变化推送的最小间隔(毫秒)"""
+        self.state_stream.interval_ms = max(0, interval_ms)
+        return {"status": "success", "interval": self.state_stream.interval_ms}
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.state_stream.changed()
+
+    def moveEvent(self, event):
+        super().moveEvent(event)
+        self.state_stream.changed()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.state_stream.changed()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.state_stream.changed()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() in (QEvent.Type.WindowStateChange, QEvent.Type.ActivationChange):
+            self.state_stream.changed()
+
+    def closeEvent(self, event):
+        super().closeEvent(event)
+        if self.app is not None and event.isAccepted():
+            self.app.forget(self)
 
     def start(self):
-        """启动应用"""
+        """启动应用，属于 Application 的窗口请使用 app.run()"""
+        if self.app is not None:
+            self.show()
+            self.startup.mark("show")
+            return
         self.show()
+        self.startup.mark("show")
         logger.info("Application started")
+        self.bridge.async_loop.start()
+        Window._app_instance.aboutToQuit.connect(self.bridge.shutdown)
         sys.exit(Window._app_instance.exec())
     
     def set_title(self, title):
@@ -650,7 +4056,7 @@ class Window(QMainWindow):
         self.log(f"Window title set to: {title}")
         return {"status": "success", "title": title}
     
-    def set_size(self, width, height):
+    def set_size(self, width: int, height: int):
         """设置窗口大小"""
         super().resize(width, height)
         self.log(f"Window size set to: {width}x{height}")
@@ -663,10 +4069,10 @@ class Window(QMainWindow):
             self.log(f"Window icon set to: {icon_path}")
             return {"status": "success", "icon": icon_path}
         else:
-            self.log(f"Icon file not found: {icon_path}")
+            self.log(f"Icon file not found: {icon_path}", "warning")
             return {"status": "error", "message": "Icon file not found"}
     
-    def set_position(self, x, y):
+    def set_position(self, x: int, y: int):
         """移动窗口到指定位置"""
         super().move(x, y)
         self.log(f"Window moved to: ({x}, {y})")
@@ -723,33 +4129,61 @@ class Window(QMainWindow):
         self.log("Window closed")
         return {"status": "success", "closed": True}
     
-    def set_min_size(self, width, height):
+    def set_min_size(self, width: int, height: int):
         """设置最小尺寸"""
         super().setMinimumSize(width, height)
         self.log(f"Minimum size set to: {width}x{height}")
         return {"status": "success", "min_width": width, "min_height": height}
     
-    def set_max_size(self, width, height):
+    def set_max_size(self, width: int, height: int):
         """设置最大尺寸"""
         super().setMaximumSize(width, height)
         self.log(f"Maximum size set to: {width}x{height}")
         return {"status": "success", "max_width": width, "max_height": height}
     
-    def after(self, ms, func_name, *args):
-        """在指定毫秒后执行函数"""
-        def execute_func():
-            if func_name in self.exposed_functions:
-                self.exposed_functions[func_name](*args)
-            elif hasattr(self, func_name) and callable(getattr(self, func_name)):
-                getattr(self, func_name)(*args)
+    def after(self, ms: int, func_name, *args):
+        """在指定毫秒后执行函数，返回可用于 cancel_timer 的 timer_id"""
+        if ms < 0:
+            return {"status": "error", "message": f"Invalid timeout: {ms}ms"}
+        timer_id = self.schedule_call(ms, func_name, args, repeat=False)
+        self.log(f"Scheduled function '{self.timers[timer_id]['function']}' to run after {ms}ms")
+        return {"status": "success", "timeout": ms, "function": self.timers[timer_id]["function"],
+                "timer_id": timer_id}
+    
+    def every(self, ms: int, func_name, *args):
+        """每隔指定毫秒执行一次函数，直到调用 cancel_timer"""
+        if ms <= 0:
+            return {"status": "error", "message": f"Invalid interval: {ms}ms"}
+        timer_id = self.schedule_call(ms, func_name, args, repeat=True)
+        self.log(f"Scheduled function '{self.timers[timer_id]['function']}' to run every {ms}ms")
+        return {"status": "success", "interval": ms, "function": self.timers[timer_id]["function"],
+                "timer_id": timer_id}
+    
+    def schedule_call(self, ms, func_name, args, repeat):
+        """登记定时任务；func_name 可以是调度表中的名字，也可以是Python可调用对象"""
+        if callable(func_name):
+            name = getattr(func_name, "__name__", repr(func_name))
+            return self.scheduler.schedule(ms, lambda: func_name(*args), name, repeat)
         
-        timer = QTimer(self)
-        timer.setSingleShot(True)
-        timer.timeout.connect(execute_func)
-        timer.start(ms)
+        def execute_func():
+            # 与JavaScript的调用一样经过调度器(并发上限、single_flight)，放在 bulk 通道中不抢占交互调用；
+            # 结果丢弃，错误写入日志；每次执行使用不同的标识，在线程池中并发执行时不会在 pending 中互相覆盖
+            callbackId = f"timer-{uuid.uuid4().hex}"
+            call = BridgeCall(func_name, list(args), callbackId, lambda *result: None)
+            self.bridge.scheduler.submit(call, lane="bulk")
         
-        self.log(f"Scheduled function '{func_name}' to run after {ms}ms")
-        return {"status": "success", "timeout": ms, "function": func_name}
+        return self.scheduler.schedule(ms, execute_func, func_name, repeat)
+    
+    def cancel_timer(self, timer_id: int):
+        """取消 after / every 登记的定时任务"""
+        if self.scheduler.cancel(timer_id):
+            self.log(f"Cancelled timer {timer_id}")
+            return {"status": "success", "timer_id": timer_id}
+        return {"status": "error", "message": "Timer not found"}
+    
+    def list_timers(self):
+        """列出待执行的定时任务及其距下次执行的毫秒数"""
+        return {"status": "success", "timers": self.scheduler.pending()}
     
     def get_size(self):
         """获取窗口大小"""
@@ -761,14 +4195,14 @@ class Window(QMainWindow):
         pos = self.pos()
         return {"x": pos.x(), "y": pos.y()}
     
-    def set_opacity(self, opacity):
+    def set_opacity(self, opacity: float):
         """设置窗口透明度"""
         if 0.0 <= opacity <= 1.0:
             self.setWindowOpacity(opacity)
             self.log(f"Window opacity set to: {opacity}")
             return {"status": "success", "opacity": opacity}
         else:
-            self.log("Invalid opacity value. Must be between 0.0 and 1.0")
+            self.log("Invalid opacity value. Must be between 0.0 and 1.0", "warning")
             return {"status": "error", "message": "Invalid opacity value"}
     
     def set_topmost(self, topmost):
@@ -800,7 +4234,7 @@ class Window(QMainWindow):
     
     def set_background_color(self, color):
         """设置背景颜色"""
-        self.browser.page().setBackgroundColor(QColor(color))
+        self.with_webview(lambda: self.page.setBackgroundColor(QColor(color)))
         self.log(f"Background color set to: {color}")
         return {"status": "success", "color": color}
     
@@ -826,43 +4260,125 @@ class Window(QMainWindow):
     
     def execute_js(self, code):
         """执行JavaScript代码"""
-        self.browser.page().runJavaScript(code)
+        self.with_webview(lambda: self.page.runJavaScript(code))
         self.log(f"Executed JavaScript: {code}")
         return {"status": "success", "code": code}
     
     def load_url(self, url):
-        """加载URL"""
-        self.browser.load(QUrl(url))
+        """加载URL，启用页面池时已预取的URL直接换进视图"""
+        if self.browser is None:
+            self.pending_url = url
+        elif self.page_pool is not None:
+            self.page_pool.visit(self.page.url())
+            page = self.page_pool.take(url)
+            prefetched = page is not None
+            self.swap_page(page if prefetched else self.page_pool.create_page(url))
+            self.log(f"Loaded URL: {url}" + (" (prefetched)" if prefetched else ""))
+            return {"status": "success", "url": url, "prefetched": prefetched}
+        else:
+            self.browser.load(QUrl(url))
         self.log(f"Loaded URL: {url}")
         return {"status": "success", "url": url}
     
+    def enable_page_pool(self, size=3, memory_budget_mb=None):
+        """启用页面池，之后 load_url 离开的页面和 prefetch 的页面留在后台，见 PagePool"""
+        def enable():
+            if self.page_pool is None:
+                self.page_pool = PagePool(self, size, memory_budget_mb)
+            else:
+                self.page_pool.size = max(0, size)
+                self.page_pool.budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+                self.page_pool.evict()
+        self.with_webview(enable)
+        return {"status": "success", "size": size, "memory_budget_mb": memory_budget_mb}
+    
+    def prefetch(self, url):
+        """在后台预先加载URL，之后 load_url(url) 不需要重新加载"""
+        if self.page_pool is None:
+            self.enable_page_pool()
+        self.with_webview(lambda: self.page_pool.prefetch(url))
+        return {"status": "success", "url": url}
+    
+    def swap_page(self, page):
+        """把网页换进视图，原来的网页交给页面池"""
+        old = self.page
+        if old.parent() is self.browser:
+            # 视图会删除自己创建的网页
+            old.setParent(self.page_pool)
+        page.setWebChannel(self.channel)
+        self.browser.setPage(page)
+        self.page = page
+        self.page_pool.put(old)
+        # 换进的页面接管窗口的事件订阅和共享状态
+        page.runJavaScript(ACTIVATE_JS)
+    
+    def get_page_pool_stats(self):
+        """获取页面池的命中率、大小和内存估计(只含JavaScript堆)"""
+        if self.page_pool is None:
+            return {"enabled": False}
+        return dict(self.page_pool.stats(), enabled=True)
+    
+    def load_bundle(self, path, host=None, **options):
+        """从目录或zip应用包加载界面，入口为 hyyhtml://<host>/
+
+        host 默认为 app-<窗口标识>，多个窗口共用网页配置时各自的应用包互不覆盖；
+        options 传给 AssetBundle，例如 index、max_bytes、max_entry。
+        包中的页面通过 <script src="hyyhtml://runtime/hyyhtml.js"></script> 引入桥接脚本。
+        """
+        if host is None:
+            # URL中的主机名不区分大小写，只保留字母、数字和连字符
+            host = "app-" + re.sub(r"[^a-z0-9-]", "-", self.window_id.lower())
+        bundle = AssetBundle(path, **options)
+        self.with_webview(lambda: self.scheme_handler.mount(host, bundle, self.window_id))
+        return self.load_url(f"hyyhtml://{host}/")
+    
+    def get_bundle_stats(self):
+        """获取已挂载应用包的资源缓存统计"""
+        if self.scheme_handler is None:
+            return {}
+        return {host: bundle.stats() for host, bundle in self.scheme_handler.bundles.items()}
+    
     def reload_page(self):
         """重新加载页面"""
-        self.browser.reload()
+        self.with_webview(lambda: self.browser.reload())
         self.log("Page reloaded")
         return {"status": "success"}
     
     def go_back(self):
         """导航回退"""
-        self.browser.back()
+        self.with_webview(lambda: self.navigate_history(-1))
         self.log("Navigated back")
         return {"status": "success"}
     
     def go_forward(self):
         """导航前进"""
-        self.browser.forward()
+        self.with_webview(lambda: self.navigate_history(1))
         self.log("Navigated forward")
         return {"status": "success"}
     
-    def set_zoom(self, factor):
+    def navigate_history(self, step):
+        """后退(-1)或前进(1)：先在当前网页的历史中移动，启用页面池时到头后换回 load_url 离开的网页"""
+        history = self.page.history()
+        if self.page_pool is None or (history.canGoBack() if step < 0 else history.canGoForward()):
+            if step < 0:
+                self.browser.back()
+            else:
+                self.browser.forward()
+            return
+        url = self.page_pool.step(step, self.page.url())
+        if url is not None:
+            page = self.page_pool.take(url)
+            self.swap_page(page if page is not None else self.page_pool.create_page(url))
+    
+    def set_zoom(self, factor: float):
         """设置缩放因子"""
-        self.browser.setZoomFactor(factor)
+        self.with_webview(lambda: self.browser.setZoomFactor(factor))
         self.log(f"Zoom factor set to: {factor}")
         return {"status": "success", "zoom": factor}
     
     def get_zoom(self):
         """获取缩放因子"""
-        factor = self.browser.zoomFactor()
+        factor = self.browser.zoomFactor() if self.browser is not None else 1.0
         return {"status": "success", "zoom": factor}
     
     def add_menu(self, title):
@@ -902,7 +4418,7 @@ class Window(QMainWindow):
         elif dialog_type == "question":
             return QMessageBox.question(self, title, message)
         else:
-            self.log(f"Unknown dialog type: {dialog_type}")
+            self.log(f"Unknown dialog type: {dialog_type}", "warning")
             return {"status": "error", "message": "Unknown dialog type"}
         
         self.log(f"Showed {dialog_type} dialog: {title}")
@@ -948,7 +4464,7 @@ class Window(QMainWindow):
             self.log(f"Cursor set to: {cursor_type}")
             return {"status": "success", "cursor": cursor_type}
         else:
-            self.log(f"Unknown cursor type: {cursor_type}")
+            self.log(f"Unknown cursor type: {cursor_type}", "warning")
             return {"status": "error", "message": "Unknown cursor type"}
     
     def set_mouse_tracking(self, enable):
@@ -957,63 +4473,845 @@ class Window(QMainWindow):
         self.log(f"Mouse tracking {'enabled' if enable else 'disabled'}")
         return {"status": "success", "enabled": enable}
     
-    def capture_screen(self):
-        """捕获整个屏幕"""
+    def capture_screen(self, options=None):
+        """捕获整个屏幕并等待编码完成，返回结果字典，选项见 process_pixmap"""
+        return self.capture_screen_async(options).result()
+    
+    def capture_window(self, options=None):
+        """捕获当前窗口并等待编码完成，返回结果字典，选项见 process_pixmap"""
+        return self.capture_window_async(options).result()
+    
+    def capture_screen_async(self, options=None):
+        """捕获整个屏幕，在线程池中编码，返回 concurrent.futures.Future"""
+        started = time.perf_counter()
+        options = options or {}
         screen = QApplication.primaryScreen()
-        pixmap = screen.grabWindow(0)
-        return self.process_pixmap(pixmap, "screen")
+        region = options.get("region")
+        if region:
+            pixmap = screen.grabWindow(0, int(region["x"]), int(region["y"]),
+                                       int(region["width"]), int(region["height"]))
+        else:
+            pixmap = screen.grabWindow(0)
+        return self.process_pixmap(pixmap, "screen", options, started)
+    
+    def capture_window_async(self, options=None):
+        """捕获当前窗口，在线程池中编码，返回 concurrent.futures.Future"""
+        started = time.perf_counter()
+        options = options or {}
+        region = options.get("region")
+        if region:
+            pixmap = self.grab(QRect(int(region["x"]), int(region["y"]),
+                                     int(region["width"]), int(region["height"])))
+        else:
+            pixmap = self.grab()
+        return self.process_pixmap(pixmap, "window", options, started)
     
-    def capture_window(self):
-        """捕获当前窗口"""
-        pixmap = self.grab()
-        return self.process_pixmap(pixmap, "window")
+    def process_pixmap(self, pixmap, source, options=None, started=None):
+        """处理捕获的图像
+
+        GUI线程中只把 QPixmap 转换为 QImage，缩放和编码在线程池中进行。
+        options 支持:
+            format    "png"(默认) / "jpeg" / "webp"
+            quality   0-100，-1 为编码器默认值
+            scale     缩放比例
+            maxWidth / maxHeight  最大尺寸，保持宽高比
+            region    {"x", "y", "width", "height"} 截取区域(由 capture_* 处理)
+            inline    为 true 时返回Base64数据URL而不是 hyyhtml://blob/<id>
+        返回的结果中 timings 记录了抓取、缩放和编码各阶段的耗时(毫秒)
+        """
+        options = options or {}
+        if started is None:
+            started = time.perf_counter()
+        
+        name = str(options.get("format", "png")).lower()
+        if name not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {name}")
+        image_format, mime = IMAGE_FORMATS[name]
+        supported = {bytes(fmt).decode().upper() for fmt in QImageWriter.supportedImageFormats()}
+        if image_format not in supported:
+            raise ValueError(f"Image format not supported by this Qt build: {name}")
+        
+        if not options.get("inline") and self.scheme_handler is None:
+            raise RuntimeError("Web view is not created yet")
+        
+        image = pixmap.toImage()
+        grab_ms = (time.perf_counter() - started) * 1000
+        return self.bridge.thread_pool().submit(
+            self.encode_image, image, source, options, image_format, mime, grab_ms)
     
-    def process_pixmap(self, pixmap, source):
-        """处理捕获的图像"""
-        # 转换为Base64
+    def encode_image(self, image, source, options, image_format, mime, grab_ms):
+        """在工作线程中缩放并编码图像"""
+        started = time.perf_counter()
+        width, height = image.width(), image.height()
+        scale = float(options.get("scale") or 1.0)
+        if options.get("maxWidth"):
+            scale = min(scale, options["maxWidth"] / width)
+        if options.get("maxHeight"):
+            scale = min(scale, options["maxHeight"] / height)
+        if scale != 1.0:
+            image = image.scaled(max(1, round(width * scale)), max(1, round(height * scale)),
+                                 Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        scaled = time.perf_counter()
+        
         buffer = QBuffer()
         buffer.open(QBuffer.OpenModeFlag.ReadWrite)
-        pixmap.save(buffer, "PNG")
-        base64_data = base64.b64encode(buffer.data()).decode('utf-8')
+        if not image.save(buffer, image_format, int(options.get("quality", -1))):
+            raise RuntimeError(f"Failed to encode {source} image as {image_format}")
+        data = bytes(buffer.data())
+        encoded = time.perf_counter()
         
-        self.log(f"Captured {source} image")
-        return {
+        result = {
             "status": "success",
             "source": source,
-            "width": pixmap.width(),
-            "height": pixmap.height(),
-            "format": "PNG",
-            "base64": f"data:image/png;base64,{base64_data}"
+            "width": image.width(),
+            "height": image.height(),
+            "format": image_format,
+            "timings": {
+                "grab_ms": round(grab_ms, 3),
+                "scale_ms": round((scaled - started) * 1000, 3),
+                "encode_ms": round((encoded - scaled) * 1000, 3)
+            }
+        }
+        if options.get("inline"):
+            # 转换为Base64
+            base64_data = base64.b64encode(data).decode('utf-8')
+            result["base64"] = f"data:{mime};base64,{base64_data}"
+        else:
+            blob_id = self.scheme_handler.blobs.add(data, mime)
+            result.update({"blob": blob_id, "url": f"hyyhtml://blob/{blob_id}", "size": len(data)})
+        
+        self.log(f"Captured {source} image")
+        return result
+    
+    def set_log_level(self, level):
+        """设置发送到JavaScript控制台的最低日志级别"""
+        if level not in LOG_LEVELS:
+            return {"status": "error", "message": "Unknown log level"}
+        self.log_level = level
+        return {"status": "success", "level": level}
+    
+    def set_log_interval(self, interval_ms: int):
+        """设置日志合并发送的间隔(毫秒)"""
+        self.bridge.log_buffer.interval_ms = max(0, interval_ms)
+        return {"status": "success", "interval": self.bridge.log_buffer.interval_ms}
+    
+    def set_event_interval(self, interval_ms: int):
+        """设置主题事件合并发送的间隔(毫秒)"""
+        self.bridge.events.interval_ms = max(0, interval_ms)
+        return {"status": "success", "interval": self.bridge.events.interval_ms}
+    
+    def stats(self):
+        """获取桥接调用统计(每个函数的调用数、错误数、延迟直方图、排队时间和数据大小)"""
+        return self.bridge.stats()
+    
+    def get_bridge_stats(self):
+        """获取桥接调用统计"""
+        return self.stats()
+    
+    def warm_process_pool(self):
+        """提前启动 executor="process" 使用的工作进程，避免第一次调用等待进程启动"""
+        self.bridge.process_pool().start()
+    
+    def set_metrics_enabled(self, enabled):
+        """启用或停用桥接调用统计"""
+        self.bridge.metrics.enabled = bool(enabled)
+        return {"status": "success", "enabled": self.bridge.metrics.enabled}
+    
+    def export_stats(self, path, format="json"):
+        """把桥接调用统计写入文件，format 为 json 或 prometheus"""
+        if format == "prometheus":
+            content = self.bridge.metrics.prometheus()
+        elif format == "json":
+            content = json.dumps(self.stats(), indent=2)
+        else:
+            raise ValueError(f"Unknown stats format: {format}")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+    
+    def get_startup_timings(self):
+        """获取启动各阶段耗时"""
+        return self.startup_timings()
+    
+    def get_cache_stats(self):
+        """获取各函数结果缓存的命中统计"""
+        return {name: cache.stats() for name, cache in self.caches.items()}
+    
+    def get_window_id(self):
+        """获取窗口标识"""
+        return {"id": self.window_id}
+    
+    def list_windows(self):
+        """列出同一 Application 中的所有窗口"""
+        windows = self.app.windows.values() if self.app is not None else [self]
+        return [{"id": window.window_id, "title": window.windowTitle(), "visible": window.isVisible()}
+                for window in windows]
+    
+    def send_to_window(self, window_id, topic, payload=None):
+        """向另一个窗口中订阅了 topic 的JavaScript发送事件"""
+        if self.app is not None:
+            target = self.app.windows.get(window_id)
+        else:
+            target = self if window_id == self.window_id else None
+        if target is None:
+            raise ValueError(f"Window '{window_id}' not found")
+        return {"status": "success", "delivered": target.emit(topic, payload)}
+    
+    def release_blob(self, blob_id):
+        """释放 capture_screen / capture_window 返回的图像数据"""
+        released = self.scheme_handler.blobs.release(blob_id)
+        return {"status": "success" if released else "error", "blob": blob_id}
+
+
+# 页面池中的网页在文档创建时执行，桥接脚本据此推迟激活，见 PagePool
+PREFETCH_JS = "window.__hyyhtmlPrefetch = true;"
+# 换进页面时激活其桥接，尚未初始化的桥接(预取时没有连接 QWebChannel)在此时初始化
+ACTIVATE_JS = """
+(function() {
+    if (window.hyyhtml && window.hyyhtml._activate) {
+        window.hyyhtml._activate(true);
+    } else if (window.__hyyhtmlInit) {
+        window.__hyyhtmlInit(true);
+    }
+})()
+"""
+# 换出页面时停用其桥接并返回JavaScript堆大小
+DEACTIVATE_JS = """
+(function() {
+    if (window.hyyhtml && window.hyyhtml._deactivate) {
+        window.hyyhtml._deactivate();
+    }
+    return performance.memory ? performance.memory.usedJSHeapSize : 0;
+})()
+"""
+
+
+class PagePool(QObject):
+    """在后台预先加载、按URL索引的网页，用于几乎即时的 load_url 导航
+
+    导航到池中的URL时直接把网页换进视图，不重新加载；被换出的网页回到池中并冻结
+    (不再运行脚本和定时器)，之后再导航回来同样不需要重新加载。
+    池中的网页超过 size 个或估计内存超过 memory_budget_mb 时按最近最少使用淘汰，
+    估计内存只是页面的JavaScript堆大小(performance.memory)，不含渲染进程的其他内存，
+    在加载完成和换出时更新。
+    所有网页共用窗口的网页配置；只有窗口中的网页连接 QWebChannel，因此事件和共享状态的广播
+    不随池的大小增加。后台网页的桥接在换进窗口时才初始化，换出时取消它的调用和流后断开。
+    各网页有各自的历史记录，load_url 在网页之间的跳转另外记录在 back / forward 中，见 Window.go_back。
+    """
+
+    def __init__(self, window, size=3, memory_budget_mb=None):
+        super().__init__(window)
+        self.window = window
+        self.size = max(0, size)
+        self.budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        # URL -> 网页，按最近使用排序
+        self.pages = OrderedDict()
+        # load_url 离开的网页地址，当前网页自己的历史到头后由 go_back / go_forward 换回
+        self.back = []
+        self.forward = []
+        self.hits = 0
+        self.misses = 0
+        self.prefetches = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(url):
+        url = url if isinstance(url, QUrl) else QUrl.fromUserInput(url)
+        url = url.adjusted(QUrl.UrlFormattingOption.StripTrailingSlash)
+        if url.path() == "/":
+            url.setPath("")
+        return url.toString()
+
+    def create_page(self, url=None):
+        """创建共用窗口网页配置的网页，url 不为空时开始加载"""
+        page = QWebEnginePage(self.window.page.profile(), self)
+        script = QWebEngineScript()
+        script.setName("hyyhtml-prefetch")
+        script.setSourceCode(PREFETCH_JS)
+        script.setInjectionPoint(QWebEngineScript.InjectionPoint.DocumentCreation)
+        script.setWorldId(QWebEngineScript.ScriptWorldId.MainWorld)
+        script.setRunsOnSubFrames(False)
+        page.scripts().insert(script)
+        page.pool_bytes = 0
+        page.loadFinished.connect(lambda ok: self.loaded(page, ok))
+        if url is not None:
+            page.load(QUrl.fromUserInput(url) if isinstance(url, str) else url)
+        return page
+
+    def prefetch(self, url):
+        """在后台加载 url，已在池中时只更新其使用顺序；返回是否开始了新的加载"""
+        key = self.key(url)
+        if key in self.pages:
+            self.pages.move_to_end(key)
+            return False
+        self.pages[key] = self.create_page(url)
+        self.prefetches += 1
+        self.evict()
+        return True
+
+    def take(self, url):
+        """取出 url 对应的网页(可能仍在加载)，不在池中时返回 None"""
+        page = self.pages.pop(self.key(url), None)
+        if page is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        page.setLifecycleState(QWebEnginePage.LifecycleState.Active)
+        return page
+
+    def visit(self, url):
+        """记录 load_url 离开的网页地址，新的跳转清空前进记录"""
+        if not url.isEmpty():
+            self.back.append(url)
+        self.forward.clear()
+
+    def step(self, step, current):
+        """返回后退(-1)或前进(1)要换回的地址，没有记录时返回 None"""
+        source, target = (self.back, self.forward) if step < 0 else (self.forward, self.back)
+        if not source:
+            return None
+        target.append(current)
+        return source.pop()
+
+    def put(self, page):
+        """收回从视图中换出的网页"""
+        url = page.url()
+        if url.isEmpty():
+            page.deleteLater()
+            return
+        key = self.key(url)
+        previous = self.pages.pop(key, None)
+        if previous is not None and previous is not page:
+            previous.deleteLater()
+        page.setParent(self)
+        self.pages[key] = page
+
+        def measured(size):
+            page.pool_bytes = int(size or 0)
+            if page is not self.window.page:
+                page.setWebChannel(None)
+            if page in self.pages.values():
+                page.setLifecycleState(QWebEnginePage.LifecycleState.Frozen)
+            self.evict()
+
+        page.runJavaScript(DEACTIVATE_JS, measured)
+
+    def loaded(self, page, ok):
+        if page is self.window.page:
+            return
+        if not ok:
+            self.discard(page)
+            return
+
+        def measured(size):
+            page.pool_bytes = int(size or 0)
+            if page is not self.window.page and page in self.pages.values():
+                page.setLifecycleState(QWebEnginePage.LifecycleState.Frozen)
+            self.evict()
+
+        page.runJavaScript("performance.memory ? performance.memory.usedJSHeapSize : 0", measured)
+
+    def discard(self, page):
+        for key, pooled in list(self.pages.items()):
+            if pooled is page:
+                del self.pages[key]
+                page.deleteLater()
+
+    def memory(self):
+        return sum(page.pool_bytes for page in self.pages.values())
+
+    def evict(self):
+        """按最近最少使用淘汰超出数量或内存预算的网页"""
+        while self.pages and (len(self.pages) > self.size or (self.budget is not None and self.memory() > self.budget)):
+            key, page = self.pages.popitem(last=False)
+            logger.debug(f"Evicted pooled page {key}")
+            page.deleteLater()
+            self.evictions += 1
+
+    def clear(self):
+        for page in self.pages.values():
+            page.deleteLater()
+        self.pages.clear()
+
+    def stats(self):
+        navigations = self.hits + self.misses
+        return {
+            "size": len(self.pages),
+            "max_size": self.size,
+            "memory_bytes": self.memory(),
+            "memory_budget_bytes": self.budget,
+            # memory_bytes 只统计各网页的JavaScript堆
+            "memory_source": "js_heap",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / navigations, 4) if navigations else 0.0,
+            "prefetches": self.prefetches,
+            "evictions": self.evictions,
+            "pages": list(self.pages),
+        }
+
+
+# 渲染前检查页面是否空闲：字体和图片已加载并且至少绘制了两帧，空闲时返回文档尺寸
+RENDER_IDLE_JS = """
+(function() {
+    if (window.__hyyhtmlIdle === undefined) {
+        window.__hyyhtmlIdle = false;
+        const painted = () => requestAnimationFrame(() => requestAnimationFrame(() => {
+            window.__hyyhtmlIdle = true;
+        }));
+        (document.fonts ? document.fonts.ready : Promise.resolve()).then(painted, painted);
+    }
+    if (!window.__hyyhtmlIdle || !Array.from(document.images).every(image => image.complete)) {
+        return null;
+    }
+    const root = document.documentElement;
+    return [root.scrollWidth, root.scrollHeight];
+})()
+"""
+
+
+class RenderJob:
+    """BatchRenderer 中等待渲染的一个文档"""
+    __slots__ = ("batch", "index", "name", "html", "base_url", "url", "format", "path", "started", "marks")
+
+    def __init__(self, batch, index, document, output_dir, fmt):
+        if isinstance(document, str):
+            document = {"html": document} if document.lstrip().startswith("<") else {"url": document}
+        self.batch = batch
+        self.index = index
+        self.html = document.get("html")
+        self.base_url = document.get("base_url")
+        self.url = document.get("url")
+        if self.html is None and self.url is None:
+            raise ValueError(f"Document {index} needs 'html' or 'url'")
+        self.format = str(document.get("format", fmt)).lower()
+        if self.format not in ("png", "pdf"):
+            raise ValueError(f"Unknown render format: {self.format}")
+        name = document.get("name")
+        if name is None:
+            stem = os.path.splitext(os.path.basename(QUrl(self.url).path().rstrip("/")))[0] if self.url else ""
+            name = f"{index:04d}-{stem}" if stem else f"{index:04d}"
+        self.name = name
+        self.path = os.path.join(output_dir, f"{name}.{self.format}")
+        self.started = None
+        self.marks = {}
+
+    def source(self):
+        """要加载的地址，本地文件路径转换为 file:// URL"""
+        if os.path.exists(self.url):
+            return QUrl.fromLocalFile(os.path.abspath(self.url))
+        return QUrl.fromUserInput(self.url)
+
+    def mark(self, phase):
+        self.marks[phase] = time.perf_counter()
+
+    def timings(self):
+        """各阶段耗时(毫秒)"""
+        timings = {"queued_ms": round((self.started - self.batch["started"]) * 1000, 3)}
+        last = self.started
+        for phase, moment in self.marks.items():
+            timings[f"{phase}_ms"] = round((moment - last) * 1000, 3)
+            last = moment
+        timings["total_ms"] = round((last - self.started) * 1000, 3)
+        return timings
+
+
+class BatchRenderer(QObject):
+    """用一组离屏网页并发地把HTML文档或URL渲染为PNG或PDF文件
+
+        renderer = BatchRenderer(pool_size=4)
+        renderer.rendered.connect(print)
+        future = renderer.render(["report.html", "<h1>Hi</h1>", "https://example.com"], "out", "pdf")
+
+    最多 pool_size 个网页同时加载不同的文档。页面加载完成后轮询 RENDER_IDLE_JS 等待页面空闲，
+    再等待 settle_ms 毫秒；PNG 在GUI线程中抓取，编码和写文件在线程池中进行，
+    抓取后网页立即开始加载下一个文档；PDF 由 Chromium 直接写出。
+    每个文件写完后立即发出 rendered 信号，结果中带各阶段耗时(毫秒)，
+    全部完成后发出 finished 并完成 render() 返回的 Future。
+    可在 offscreen 平台(QT_QPA_PLATFORM=offscreen)下无界面运行，吞吐量可用 benchmarks/bench_render.py 测量。
+    """
+    rendered = pyqtSignal(object)
+    finished = pyqtSignal(object)
+
+    def __init__(self, pool_size=4, width=1280, height=800, profile=None, timeout=30.0, settle_ms=50,
+                 full_page=True, pdf_layout=None):
+        """profile 为 None 时使用默认网页配置；full_page 为 True 时PNG包含整个文档高度；
+        pdf_layout 为 QPageLayout，默认A4纵向、10毫米边距；timeout 为每个文档的最长秒数
+        """
+        Window.ensure_application()
+        super().__init__()
+        self.pool_size = max(1, pool_size)
+        self.width = width
+        self.height = height
+        self.profile = profile
+        self.timeout = timeout
+        self.settle_ms = settle_ms
+        self.full_page = full_page
+        self.pdf_layout = pdf_layout or QPageLayout(QPageSize(QPageSize.PageSizeId.A4),
+                                                    QPageLayout.Orientation.Portrait,
+                                                    QMarginsF(10, 10, 10, 10), QPageLayout.Unit.Millimeter)
+        self.views = []
+        self.idle = []
+        self.queue = deque()
+        self.executor = None
+        self.invoker = MainThreadInvoker()
+
+    def render(self, documents, output_dir, fmt="png"):
+        """渲染一批文档，返回以汇总结果完成的 concurrent.futures.Future
+
+        documents 中的每一项可以是HTML文本(以 < 开头)、URL或本地文件路径，
+        也可以是 {"html" 或 "url", "base_url", "name", "format"}；文件名默认为序号
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        batch = {"future": Future(), "results": [], "remaining": 0, "started": time.perf_counter()}
+        jobs = [RenderJob(batch, index, document, output_dir, fmt) for index, document in enumerate(documents)]
+        batch["remaining"] = len(jobs)
+        if not jobs:
+            self.complete(batch)
+            return batch["future"]
+        self.queue.extend(jobs)
+        while len(self.views) < self.pool_size and len(self.idle) < len(self.queue):
+            self.idle.append(self.create_view())
+        self.pump()
+        return batch["future"]
+
+    def create_view(self):
+        """创建一个不显示在屏幕上的网页视图"""
+        QWebEngineView = load_webengine()
+        view = QWebEngineView()
+        if self.profile is not None:
+            view.setPage(QWebEnginePage(self.profile, view))
+        install_scheme_handler(view.page().profile())
+        view.setAttribute(Qt.WidgetAttribute.WA_DontShowOnScreen)
+        view.resize(self.width, self.height)
+        view.show()
+        view.job = None
+        view.timer = QTimer(view)
+        view.timer.setSingleShot(True)
+        view.timer.timeout.connect(lambda: self.fail(view, f"timed out after {self.timeout}s"))
+        page = view.page()
+        page.loadFinished.connect(lambda ok: self.loaded(view, ok))
+        page.pdfPrintingFinished.connect(lambda path, ok: self.printed(view, ok))
+        self.views.append(view)
+        return view
+
+    def pump(self):
+        """把等待中的文档分配给空闲的网页"""
+        while self.queue and self.idle:
+            view = self.idle.pop()
+            job = self.queue.popleft()
+            job.started = time.perf_counter()
+            view.job = job
+            view.resize(self.width, self.height)
+            view.timer.start(int(self.timeout * 1000))
+            if job.html is not None:
+                base_url = QUrl.fromLocalFile(os.path.abspath(job.base_url or os.getcwd()) + "/")
+                view.page().setHtml(job.html, base_url)
+            else:
+                view.page().load(job.source())
+
+    def loaded(self, view, ok):
+        job = view.job
+        if job is None or "load" in job.marks:
+            return
+        if not ok:
+            self.fail(view, "failed to load")
+            return
+        job.mark("load")
+        self.poll_idle(view, job)
+
+    def poll_idle(self, view, job):
+        def check(size):
+            if view.job is not job:
+                return
+            if not size:
+                QTimer.singleShot(25, lambda: self.poll_idle(view, job))
+                return
+            job.mark("idle")
+            if job.format == "png" and self.full_page:
+                view.resize(self.width, max(self.height, int(size[1])))
+            QTimer.singleShot(self.settle_ms, lambda: self.capture(view, job))
+
+        view.page().runJavaScript(RENDER_IDLE_JS, check)
+
+    def capture(self, view, job):
+        if view.job is not job:
+            return
+        if job.format == "pdf":
+            view.page().printToPdf(job.path, self.pdf_layout)
+            return
+        image = view.grab().toImage()
+        job.mark("capture")
+        self.release(view)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="hyyhtml-render")
+        future = self.executor.submit(self.write_image, image, job.path)
+        future.add_done_callback(lambda f: self.invoker.invoke.emit(lambda: self.written(job, f)))
+
+    @staticmethod
+    def write_image(image, path):
+        """在工作线程中编码并写出PNG"""
+        if not image.save(path, "PNG"):
+            raise RuntimeError(f"Failed to write {path}")
+        return os.path.getsize(path)
+
+    def written(self, job, future):
+        job.mark("write")
+        try:
+            self.finish(job, {"status": "success", "bytes": future.result()})
+        except Exception as e:
+            self.finish(job, {"status": "error", "error": str(e)})
+
+    def printed(self, view, ok):
+        job = view.job
+        if job is None:
+            return
+        job.mark("print")
+        self.release(view)
+        if ok:
+            self.finish(job, {"status": "success", "bytes": os.path.getsize(job.path)})
+        else:
+            self.finish(job, {"status": "error", "error": "failed to print PDF"})
+
+    def fail(self, view, error):
+        job = view.job
+        if job is None:
+            return
+        logger.error(f"Render of {job.name} failed: {error}")
+        job.mark("fail")
+        view.timer.stop()
+        view.job = None
+        # 超时的页面可能仍在加载，换一个新的网页，避免旧页面的信号串到下一个文档
+        self.views.remove(view)
+        view.deleteLater()
+        if self.queue:
+            self.idle.append(self.create_view())
+        self.finish(job, {"status": "error", "error": error})
+        self.pump()
+
+    def release(self, view):
+        view.timer.stop()
+        view.job = None
+        self.idle.append(view)
+        self.pump()
+
+    def finish(self, job, result):
+        result.update(name=job.name, index=job.index, format=job.format,
+                      path=job.path if result["status"] == "success" else None,
+                      source=job.url or "html", timings=job.timings())
+        batch = job.batch
+        batch["results"].append(result)
+        self.rendered.emit(result)
+        batch["remaining"] -= 1
+        if batch["remaining"] == 0:
+            self.complete(batch)
+
+    def complete(self, batch):
+        results = sorted(batch["results"], key=lambda result: result["index"])
+        elapsed = time.perf_counter() - batch["started"]
+        summary = {
+            "status": "success" if all(result["status"] == "success" for result in results) else "error",
+            "documents": results,
+            "rendered": sum(result["status"] == "success" for result in results),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "documents_per_second": round(len(results) / elapsed, 2) if elapsed else 0.0,
+            "pool_size": self.pool_size,
         }
+        batch["future"].set_result(summary)
+        self.finished.emit(summary)
+
+    def close(self):
+        """关闭所有网页和写文件的线程池"""
+        self.queue.clear()
+        for view in self.views:
+            view.timer.stop()
+            view.deleteLater()
+        self.views.clear()
+        self.idle.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+class Application:
+    """拥有 QApplication、共享网页配置和全局API注册表的应用，可以创建多个窗口
+
+        app = Application()
+
+        @app.api
+        def hello(name):
+            return f"Hello {name}, from {current_window().window_id}"
+
+        main = app.create_window("main")
+        panel = app.create_window("panel")
+        app.emit("theme", "dark")          # 所有窗口
+        app.emit("count", 1, "panel")      # 指定窗口
+        sys.exit(app.run())
+
+    所有窗口共用一个 QWebEngineProfile(及其 hyyhtml:// 处理器和HTTP缓存)、
+    一个API线程池和一个asyncio事件循环；每个窗口只有自己的 QWebChannel、JSBridge 和页面。
+    渲染进程是否共用由Chromium的进程模型决定，共用配置不保证减少渲染进程的内存，
+    实际的每窗口占用需在目标机器上用 benchmarks/bench_windows.py 测量。
+    """
+
+    def __init__(self, dispatch_mode="main", max_workers=None, profile_name=None, process_workers=None):
+        """profile_name 为空时使用不写磁盘的网页配置，否则缓存和存储保存在该名称的目录中"""
+        if dispatch_mode not in DISPATCH_MODES:
+            raise ValueError(f"Unknown dispatch mode: {dispatch_mode}")
+        
+        Window.ensure_application()
+        self.qapp = Window._app_instance
+        self.dispatch_mode = dispatch_mode
+        self.max_workers = max_workers
+        self.profile_name = profile_name
+        self.profile = None
+        self.executor = None
+        self.process_workers = process_workers
+        self.processes = None
+        self.async_loop = AsyncioLoop()
+        
+        # 全局API注册表，所有窗口的调度表都包含这些函数
+        self.exposed_functions = {}
+        self.api_options = {}
+        self.cache_options = {}
+        self.windows = {}
+        
+        self.qapp.aboutToQuit.connect(self.shutdown)
+
+    def web_profile(self):
+        """获取(必要时创建)所有窗口共用的网页配置"""
+        if self.profile is None:
+            if self.profile_name:
+                self.profile = QWebEngineProfile(self.profile_name, self.qapp)
+            else:
+                self.profile = QWebEngineProfile(self.qapp)
+            install_scheme_handler(self.profile)
+        return self.profile
+
+    def thread_pool(self):
+        """获取(必要时创建)所有窗口共用的线程池"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                               thread_name_prefix="hyyhtml-api")
+        return self.executor
+
+    def process_pool(self):
+        """获取(必要时创建)所有窗口共用的进程池"""
+        if self.processes is None:
+            self.processes = ProcessPool(MainThreadInvoker(), self.process_workers)
+        return self.processes
+
+    def create_window(self, window_id=None, **options):
+        """创建属于该应用的窗口，options 传给 Window"""
+        window_id = window_id or uuid.uuid4().hex[:8]
+        if window_id in self.windows:
+            raise ValueError(f"Window '{window_id}' already exists")
+        options.setdefault("dispatch_mode", self.dispatch_mode)
+        window = Window(app=self, window_id=window_id, **options)
+        self.windows[window_id] = window
+        return window
+
+    def window(self, window_id):
+        return self.windows.get(window_id)
+
+    def forget(self, window):
+        """窗口关闭后不再接收广播和调用"""
+        if self.windows.get(window.window_id) is window:
+            del self.windows[window.window_id]
+            window.bridge.shutdown()
+
+    def api(self, func=None, *, executor=None, cache=None, max_concurrency=None, priority="normal",
+            single_flight=False):
+        """装饰器，为所有窗口(包括之后创建的窗口)注册Python函数，参数同 Window.api
+
+        在API函数中用 current_window() 获取发起调用的窗口。
+        """
+        if func is None:
+            return partial(self.api, executor=executor, cache=cache, max_concurrency=max_concurrency,
+                           priority=priority, single_flight=single_flight)
+
+        name = func.__name__
+        self.api_options[name] = make_api_options(func, executor, max_concurrency, priority, single_flight)
+        self.exposed_functions[name] = func
+        if cache:
+            options = {"maxsize": 128, "ttl": None, "key": None}
+            options.update(cache if isinstance(cache, dict) else {})
+            self.cache_options[name] = options
+        for window in self.windows.values():
+            if cache:
+                window.enable_cache(name, **self.cache_options[name])
+            else:
+                window.rebuild_dispatch_table()
+        logger.info(f"Registered function for JavaScript: {name}")
+        return func
+
+    def invalidate(self, name, *args):
+        """在所有窗口中删除函数的缓存结果"""
+        for window in self.windows.values():
+            window.invalidate(name, *args)
+
+    def emit(self, topic, payload=None, window_id=None):
+        """向所有窗口(或 window_id 指定的窗口)中订阅了 topic 的JavaScript发送事件
+
+        返回收到事件的窗口数量
+        """
+        if window_id is not None:
+            window = self.windows.get(window_id)
+            if window is None:
+                raise ValueError(f"Window '{window_id}' not found")
+            return int(window.emit(topic, payload))
+        return sum(window.emit(topic, payload) for window in list(self.windows.values()))
+
+    def run(self):
+        """显示所有尚未显示的窗口并进入事件循环，返回退出码"""
+        for window in self.windows.values():
+            if not window.isVisible():
+                window.start()
+        logger.info("Application started")
+        return self.qapp.exec()
+
+    def shutdown(self):
+        """关闭所有窗口的桥接以及共用的线程池和事件循环"""
+        for window in list(self.windows.values()):
+            window.bridge.shutdown()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.processes is not None:
+            self.processes.shutdown()
+            self.processes = None
+        self.async_loop.stop()
 
 # ==================================================
 # 用户代码 (main.py)
 # ==================================================
-# 创建窗口实例
-window = Window()
-
-# 使用装饰器注册API函数
-@window.api
-def hello():
-    """简单的示例函数"""
-    window.log("Hello from Python!")
-    return {"message": "Hello from Python!", "status": "success"}
-
-@window.api
-def destroy():
-    """销毁窗口的函数"""
-    window.log("Destroying window...")
-    window.close_window()
-    return {"status": "closed"}
-
-# 配置窗口
-window.set_title("HyyHTML Demo Application")
-window.set_size(800, 600)
-window.set_min_size(400, 300)
-window.center()
-
-# 3秒后调用hello函数
-window.after(3000, "hello")
-
-# 启动应用
-window.start()
\ No newline at end of file
+if __name__ == "__main__":
+    # 创建窗口实例
+    window = Window()
+
+    # 使用装饰器注册API函数
+    @window.api
+    def hello():
+        """简单的示例函数"""
+        window.log("Hello from Python!")
+        return {"message": "Hello from Python!", "status": "success"}
+
+    @window.api
+    def destroy():
+        """销毁窗口的函数"""
+        window.log("Destroying window...")
+        window.close_window()
+        return {"status": "closed"}
+
+    # 配置窗口
+    window.set_title("HyyHTML Demo Application")
+    window.set_size(800, 600)
+    window.set_min_size(400, 300)
+    window.center()
+
+    # 3秒后调用hello函数
+    window.after(3000, "hello")
+
+    # 启动应用
+    window.start()
\ No newline at end of file
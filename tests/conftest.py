@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    # 由 Window 创建QApplication，先注册 hyyhtml:// 协议，测试中也能创建窗口
+    hyyhtml = pytest.importorskip("hyyhtml", exc_type=ImportError)
+    hyyhtml.Window.ensure_application()
+    return hyyhtml.Window._app_instance
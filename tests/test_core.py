@@ -0,0 +1,318 @@
+"""不依赖浏览器页面的纯Python组件测试"""
+import json
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+# hyyhtml 在模块顶层导入 QtWebEngineCore，缺少 QtWebEngine 运行库时跳过
+pytest.importorskip("PyQt6.QtWebEngineCore", exc_type=ImportError)
+
+import hyyhtml
+
+
+def test_timer_short_interval_is_clamped(qapp):
+    calls = []
+    scheduler = hyyhtml.TimerScheduler({})
+    timer_id = scheduler.schedule(1, lambda: calls.append(1), "tick", repeat=True)
+    assert scheduler.timers[timer_id]["interval"] == scheduler.tolerance_ms + 1
+    scheduler.timers[timer_id]["due"] = 0
+    scheduler.heap = [(0, timer_id)]
+    scheduler.fire()
+    assert calls == [1]
+    scheduler.cancel(timer_id)
+
+
+def test_timer_fires_each_id_once_per_wakeup(qapp):
+    calls = []
+    scheduler = hyyhtml.TimerScheduler({}, tolerance_ms=50)
+    timer_id = scheduler.schedule(51, lambda: calls.append("r"), "r", repeat=True)
+    scheduler.schedule(0, lambda: calls.append("once"), "once")
+    # 把重复任务提前到本轮到期，重新排期后仍落在容差范围内
+    scheduler.timers[timer_id]["due"] = 0
+    scheduler.heap.append((0, timer_id))
+    scheduler.fire()
+    assert sorted(calls) == ["once", "r"]
+    assert timer_id in scheduler.timers
+    scheduler.cancel(timer_id)
+
+
+def test_timer_rejects_invalid_delay(qapp):
+    scheduler = hyyhtml.TimerScheduler({})
+    with pytest.raises(ValueError):
+        scheduler.schedule(0, lambda: None, "tick", repeat=True)
+    with pytest.raises(ValueError):
+        scheduler.schedule(-1, lambda: None, "tick")
+
+
+def test_cache_key_ignores_integral_float():
+    cache = hyyhtml.ResultCache()
+    entry = hyyhtml.DispatchEntry("scale", lambda x: x, "main", cache=cache)
+    cache.put(cache.make_key(entry.convert([42.0])), "84")
+    assert cache.get(cache.make_key([42])) == "84"
+    cache.invalidate(cache.make_key([42]))
+    assert cache.stats()["size"] == 0
+
+
+def test_cache_key_uses_annotation_conversion():
+    def scale(x: float):
+        return x * 2
+    cache = hyyhtml.ResultCache()
+    entry = hyyhtml.DispatchEntry("scale", scale, "main", cache=cache)
+    assert cache.make_key(entry.convert([42])) == cache.make_key([42])
+    assert cache.make_key([1.5]) != cache.make_key([1])
+
+
+def test_bool_annotation_parses_strings():
+    def toggle(flag: bool):
+        return flag
+    entry = hyyhtml.DispatchEntry("toggle", toggle, "main")
+    assert entry.convert(["false"]) == [False]
+    assert entry.convert(["0"]) == [False]
+    assert entry.convert(["True"]) == [True]
+    assert entry.convert([1.0]) == [True]
+    with pytest.raises(ValueError):
+        entry.convert(["yes please"])
+
+
+def test_cache_skips_binary_arguments():
+    cache = hyyhtml.ResultCache()
+    assert cache.make_key([memoryview(b"ab"), 1]) is None
+    keyed = hyyhtml.ResultCache(key=lambda data, n: (bytes(data), n))
+    assert keyed.make_key([memoryview(b"ab"), 1]) == (b"ab", 1)
+
+
+def test_cache_stores_text_mentioning_binary_marker():
+    cache = hyyhtml.ResultCache()
+    replies = []
+    reply = lambda *result: replies.append(result)
+    cache.storing_reply("text", reply)("1", True, json.dumps(["__binary__"]))
+    cache.storing_reply("blob", reply)("2", True, json.dumps({"__binary__": "id"}))
+    assert cache.get("text") == '["__binary__"]'
+    assert cache.get("blob") is None
+    assert len(replies) == 2
+
+
+def test_asset_bundle_reads_and_caches_directory(tmp_path):
+    (tmp_path / "index.html").write_bytes(b"<h1>hi</h1>")
+    (tmp_path / "empty.txt").write_bytes(b"")
+    bundle = hyyhtml.AssetBundle(str(tmp_path))
+    data, mime, etag = bundle.get("/")
+    assert (data, mime) == (b"<h1>hi</h1>", "text/html")
+    assert bundle.get("index.html")[2] == etag
+    assert bundle.get("empty.txt")[0] == b""
+    assert bundle.get("../secret") is None
+    assert bundle.get("missing.js") is None
+    assert bundle.stats()["hits"] == 1
+
+
+def test_windows_mount_bundles_on_separate_hosts(qapp, tmp_path):
+    for name in ("one", "two"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "index.html").write_bytes(name.encode())
+    first = hyyhtml.Window(window_id="One")
+    second = hyyhtml.Window(window_id="two")
+    assert first.scheme_handler is second.scheme_handler
+    first.load_bundle(str(tmp_path / "one"))
+    second.load_bundle(str(tmp_path / "two"))
+    bundles = first.scheme_handler.bundles
+    assert bundles["app-one"].get("/")[0] == b"one"
+    assert bundles["app-two"].get("/")[0] == b"two"
+    with pytest.raises(ValueError):
+        second.load_bundle(str(tmp_path / "two"), host="app-one")
+    assert bundles["app-one"].get("/")[0] == b"one"
+
+
+class FakeBridge:
+    """只记录调度结果的桥接对象，供 CallScheduler 测试使用"""
+
+    def __init__(self, *entries):
+        self.window = SimpleNamespace(dispatch_table={entry.name: entry for entry in entries})
+        self.invoker = SimpleNamespace(invoke=SimpleNamespace(emit=lambda callback: callback()))
+        self.metrics = hyyhtml.BridgeMetrics()
+        self.dispatched = []
+
+    def dispatch(self, call, entry=None):
+        self.dispatched.append(call)
+
+
+def test_scheduler_keeps_slot_until_cancelled_work_finishes(qapp):
+    entry = hyyhtml.DispatchEntry("work", lambda n: n, "thread", limit=1)
+    bridge = FakeBridge(entry)
+    scheduler = hyyhtml.CallScheduler(bridge)
+    first = hyyhtml.BridgeCall("work", [1], "a", lambda *result: None)
+    scheduler.submit(first)
+    first.future = Future()
+    first.future.set_running_or_notify_cancel()
+    # JavaScript放弃了调用，但函数仍在运行
+    first.reply("a", False, '{"error": "Call cancelled (abort)", "cancelled": "abort"}')
+    scheduler.submit(hyyhtml.BridgeCall("work", [2], "b", lambda *result: None))
+    scheduler.drain()
+    assert [call.callbackId for call in bridge.dispatched] == ["a"]
+    first.future.set_result("1")
+    scheduler.drain()
+    assert [call.callbackId for call in bridge.dispatched] == ["a", "b"]
+
+
+def test_scheduler_runs_interactive_lane_first(qapp):
+    bulk = hyyhtml.DispatchEntry("bulk", lambda: None, "main", priority="bulk")
+    urgent = hyyhtml.DispatchEntry("urgent", lambda: None, "main", priority="interactive")
+    bridge = FakeBridge(bulk, urgent)
+    scheduler = hyyhtml.CallScheduler(bridge)
+    for index in range(3):
+        scheduler.submit(hyyhtml.BridgeCall("bulk", [], f"b{index}", lambda *result: None))
+    scheduler.submit(hyyhtml.BridgeCall("urgent", [], "u", lambda *result: None))
+    scheduler.drain()
+    assert [call.callbackId for call in bridge.dispatched] == ["u", "b0", "b1", "b2"]
+
+
+class StateBridge:
+    """收集 StateStore 发往JavaScript的消息"""
+
+    def __init__(self):
+        self.messages = []
+        self.invoker = SimpleNamespace(invoke=SimpleNamespace(emit=lambda callback: None))
+        self.stateToJS = SimpleNamespace(emit=lambda payload: self.messages.append(json.loads(payload)))
+
+
+def test_diff_and_apply_round_trip():
+    old = {"a": 1, "b": {"c": [1, 2, 3]}, "gone": True}
+    new = {"a": 1, "b": {"c": [1, 5]}, "added": {"x": None}}
+    ops = hyyhtml.diff_values(json.loads(json.dumps(old)), new)
+    document = json.loads(json.dumps(old))
+    for op in ops:
+        document = hyyhtml.apply_patch_op(document, op)
+    assert document == new
+    assert all(op["path"] != "/a" for op in ops)
+
+
+def test_apply_creates_missing_parents():
+    document = hyyhtml.apply_patch_op({}, {"op": "add", "path": "/missing/deep", "value": 1})
+    assert document == {"missing": {"deep": 1}}
+    assert hyyhtml.apply_patch_op(document, {"op": "remove", "path": "/nope/x"}) == document
+    with pytest.raises(ValueError):
+        hyyhtml.apply_patch_op(document, {"op": "add", "path": "/missing/deep/x", "value": 2})
+
+
+def test_state_set_under_missing_parent():
+    store = hyyhtml.StateStore(StateBridge())
+    assert store.set("/missing/deep", 1) == [{"op": "add", "path": "/missing/deep", "value": 1}]
+    assert store.get("/missing") == {"deep": 1}
+
+
+def test_state_rejects_conflicting_patch():
+    bridge = StateBridge()
+    store = hyyhtml.StateStore(bridge)
+    store.set("/a", 1)
+    store.flush()
+    store.receive({"id": 1, "base": 0, "ops": [{"op": "replace", "path": "/b", "value": 2}]})
+    assert bridge.messages[-1]["kind"] == "ack"
+    store.receive({"id": 2, "base": 0, "ops": [{"op": "replace", "path": "/a", "value": 3}]})
+    assert bridge.messages[-1]["kind"] == "snapshot"
+    assert bridge.messages[-1]["rejected"] == 2
+    assert store.get() == {"a": 1, "b": 2}
+    assert store.stats()["conflicts"] == 1
+
+
+def test_metrics_ignore_unknown_functions(qapp):
+    window = hyyhtml.Window(metrics=True)
+    replies = []
+    reply = lambda *result: replies.append(result)
+    window.bridge.dispatch(hyyhtml.BridgeCall("no_such_function", [], "1", reply))
+    window.bridge.dispatch(hyyhtml.BridgeCall("get_window_id", [], "2", reply))
+    assert [success for _, success, _ in replies] == [False, True]
+    assert list(window.bridge.metrics.functions) == ["get_window_id"]
+
+
+def test_prometheus_escapes_label_values():
+    metrics = hyyhtml.BridgeMetrics(enabled=True)
+    metrics.functions['a"b\\c\nd'] = hyyhtml.FunctionMetrics()
+    text = metrics.prometheus()
+    assert 'hyyhtml_bridge_calls_total{function="a\\"b\\\\c\\nd"} 0' in text.splitlines()
+
+
+def test_queue_wait_includes_lane_wait(qapp):
+    window = hyyhtml.Window(metrics=True)
+
+    @window.api(priority="bulk")
+    def bulk():
+        return 1
+
+    replies = []
+    window.bridge.scheduler.submit(hyyhtml.BridgeCall("bulk", [], "1", lambda *result: replies.append(result)))
+    time.sleep(0.02)
+    deadline = time.monotonic() + 1
+    while not replies and time.monotonic() < deadline:
+        qapp.processEvents()
+    assert replies == [("1", True, "1")]
+    assert window.bridge.metrics.functions["bulk"].queue_wait.total >= 0.02
+
+
+def test_timer_calls_go_through_bulk_lane(qapp):
+    window = hyyhtml.Window()
+    seen = []
+
+    @window.api
+    def tick(value):
+        seen.append(value)
+
+    window.after(0, "tick", 7)
+    deadline = time.monotonic() + 1
+    while not seen and time.monotonic() < deadline:
+        qapp.processEvents()
+    assert seen == [7]
+    assert window.bridge.scheduler.stats()["bulk"]["dispatched"] == 1
+
+
+def test_single_flight_merges_single_and_batched_calls(qapp):
+    window = hyyhtml.Window()
+    release = threading.Event()
+
+    @window.api(executor="thread", single_flight=True)
+    def slow(n):
+        release.wait(1)
+        return n * 2
+
+    replies = []
+    window.bridge.callbackToJS.connect(lambda *result: replies.append(result))
+    # QWebChannel 把数字作为浮点数传给单独的调用，批量信封中则是整数
+    window.bridge.handleCall("slow", [42.0], "single")
+    window.bridge.handleBatch(json.dumps([["slow", [42], "batched"]]))
+    release.set()
+    deadline = time.monotonic() + 2
+    while len(replies) < 2 and time.monotonic() < deadline:
+        qapp.processEvents()
+    assert sorted(callbackId for callbackId, _, _ in replies) == ["batched", "single"]
+    assert window.bridge.flights.stats()["executions"] == 1
+
+
+def test_page_pool_history_across_swapped_pages(qapp):
+    pool = hyyhtml.PagePool(hyyhtml.Window())
+    a, b, c = (hyyhtml.QUrl(f"https://{name}.example") for name in "abc")
+    pool.visit(a)
+    pool.visit(b)
+    assert pool.step(-1, c) == b
+    assert pool.step(-1, b) == a
+    assert pool.step(-1, a) is None
+    assert pool.step(1, a) == b
+    pool.visit(b)
+    assert pool.step(1, c) is None
+
+
+def test_capture_returns_dict_and_async_variant_returns_future(qapp):
+    window = hyyhtml.Window()
+    window.resize(64, 48)
+    result = window.capture_window({"inline": True})
+    assert result["status"] == "success"
+    assert result["base64"].startswith("data:image/png;base64,")
+    future = window.capture_window_async({"format": "jpeg", "inline": True})
+    assert future.result(timeout=5)["format"] == "JPEG"
+    assert window.dispatch_table["capture_window"].func == window.capture_window_async
+
+
+def test_cancel_token_outside_calls_is_never_shared():
+    token = hyyhtml.cancel_token()
+    token.cancel()
+    assert not hyyhtml.cancel_token().cancelled